@@ -0,0 +1,203 @@
+"""
+OpenAI Batch API mode for offline summarization.
+
+Summaries have no latency requirement, so instead of realtime chat calls the
+pipeline can write one JSONL request per article, submit it as a batch
+(discounted price, separate and much larger rate limits), poll until it
+finishes and map the results back by `custom_id`. The hallucination check
+needs the summary text, so it runs as a second batch.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Optional
+
+from langchain_core.messages import BaseMessage, convert_to_openai_messages
+from openai import AsyncOpenAI
+
+from .llm_orchestrator import (
+    LLM,
+    OPENAI_MODEL,
+    hallucination_prompt,
+    lay_summary_prompt,
+    parse_hallucination_response,
+    record_usage,
+)
+from .models import PipelineConfig, PubMedArticle, SummaryResult
+from .prompts import get_template
+from .tracing import span
+
+DATA_DIR = Path(os.getenv("DATA_DIR", "data"))
+POLL_SECONDS = float(os.getenv("OPENAI_BATCH_POLL_SECONDS", "60"))
+ENDPOINT = "/v1/chat/completions"
+TERMINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+
+logger = logging.getLogger(__name__)
+
+
+def _chat_request(custom_id: str, messages: list[BaseMessage]) -> dict:
+    """
+    One Batch API input line, equivalent to the realtime LLM call. The messages
+    are the same rendered template, so batched requests share its cached prefix.
+    """
+    return {
+        "custom_id": custom_id,
+        "method": "POST",
+        "url": ENDPOINT,
+        "body": {
+            "model": OPENAI_MODEL,
+            "temperature": LLM.temperature,
+            "messages": convert_to_openai_messages(messages),
+        },
+    }
+
+
+def request_path(config: PipelineConfig, kind: str, requests: list[dict]) -> Path:
+    """
+    Request file named by a hash of its content: concurrent workers never share
+    a file, and a rerun over the same articles finds its earlier batch.
+    """
+    content = "".join(json.dumps(r, ensure_ascii=False, sort_keys=True) for r in requests)
+    digest = hashlib.sha256(content.encode("utf-8")).hexdigest()[:16]
+    return DATA_DIR / "batches" / f"pubmed_batch_{config.year}_{kind}_{digest}.jsonl"
+
+
+def write_requests(path: Path, requests: list[dict]) -> Path:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open("w", encoding="utf-8") as fhandle:
+        for request in requests:
+            fhandle.write(json.dumps(request, ensure_ascii=False) + "\n")
+    return path
+
+
+async def run_batch(
+    client: AsyncOpenAI,
+    path: Path,
+    template_key: str,
+    poll_seconds: float = POLL_SECONDS,
+) -> dict[str, str]:
+    """
+    Upload a JSONL request file, create a batch, poll until it reaches a
+    terminal status and return {custom_id: message content} for successful
+    requests. Partial output of an expired batch is still returned.
+    Usage is recorded against `template_key`, the template all requests use.
+
+    The batch id is saved next to the request file, so after a restart the
+    batch is polled again instead of being submitted (and paid for) twice.
+    """
+    state_path = path.with_suffix(".batch.json")
+    batch = None
+    if state_path.exists():
+        batch = await client.batches.retrieve(json.loads(state_path.read_text(encoding="utf-8"))["batch_id"])
+        if batch.status in TERMINAL_STATUSES and not batch.output_file_id:
+            logger.warning("Earlier batch %s ended with status '%s'; resubmitting", batch.id, batch.status)
+            batch = None
+        else:
+            logger.info("Resuming batch %s for %s", batch.id, path)
+
+    if batch is None:
+        with path.open("rb") as fhandle:
+            input_file = await client.files.create(file=fhandle, purpose="batch")
+
+        batch = await client.batches.create(
+            input_file_id=input_file.id,
+            endpoint=ENDPOINT,
+            completion_window="24h",
+            metadata={"source": path.name},
+        )
+        state_path.write_text(json.dumps({"batch_id": batch.id}), encoding="utf-8")
+        logger.info("Submitted batch %s from %s", batch.id, path)
+
+    with span("batch.wait", batch_id=batch.id):
+        while batch.status not in TERMINAL_STATUSES:
+            await asyncio.sleep(poll_seconds)
+            batch = await client.batches.retrieve(batch.id)
+
+    if batch.status != "completed" and not batch.output_file_id:
+        raise RuntimeError(f"Batch {batch.id} ended with status '{batch.status}'")
+
+    results: dict[str, str] = {}
+    if batch.output_file_id:
+        output = await client.files.content(batch.output_file_id)
+        for line in output.text.splitlines():
+            if not line.strip():
+                continue
+            row = json.loads(line)
+            response = row.get("response") or {}
+            if response.get("status_code") != 200:
+                continue
+            body = response["body"]
+            usage = body.get("usage") or {}
+            cached = (usage.get("prompt_tokens_details") or {}).get("cached_tokens", 0)
+            record_usage(template_key, {
+                "input_tokens": usage.get("prompt_tokens", 0),
+                "output_tokens": usage.get("completion_tokens", 0),
+                "input_token_details": {"cache_read": cached},
+            })
+            results[row["custom_id"]] = body["choices"][0]["message"]["content"].strip()
+
+    failed = batch.request_counts.failed if batch.request_counts else 0
+    if failed or batch.status != "completed":
+        logger.warning(
+            "Batch %s ended with status '%s': %d requests failed", batch.id, batch.status, failed
+        )
+
+    return results
+
+
+async def summarize_articles_batch(
+    articles: list[PubMedArticle],
+    config: PipelineConfig,
+    client: Optional[AsyncOpenAI] = None,
+    poll_seconds: float = POLL_SECONDS,
+) -> list[SummaryResult]:
+    """
+    Batch equivalent of summarizing each article with generate_lay_summary and
+    check_hallucinations. Articles whose summary or hallucination-check request
+    failed are omitted, so a rerun of the pipeline picks them up.
+    """
+    if not articles:
+        return []
+
+    client = client or AsyncOpenAI()
+
+    summary_requests = [_chat_request(f"{a.pmid}:summary", lay_summary_prompt(a)) for a in articles]
+    summary_path = write_requests(request_path(config, "summaries", summary_requests), summary_requests)
+    summaries = await run_batch(client, summary_path, get_template("lay_summary").key, poll_seconds)
+
+    summarized = [a for a in articles if f"{a.pmid}:summary" in summaries]
+    check_requests = [
+        _chat_request(f"{a.pmid}:hallucinations", hallucination_prompt(a, summaries[f"{a.pmid}:summary"]))
+        for a in summarized
+    ]
+    checks: dict[str, str] = {}
+    if check_requests:
+        check_path = write_requests(request_path(config, "hallucinations", check_requests), check_requests)
+        checks = await run_batch(client, check_path, get_template("hallucination_check").key, poll_seconds)
+
+    results: list[SummaryResult] = []
+    for article in summarized:
+        check = checks.get(f"{article.pmid}:hallucinations")
+        if check is None:
+            # an unchecked summary would otherwise be stored as a clean score-0 result
+            continue
+        score, questionable_claims = parse_hallucination_response(check)
+        results.append(
+            SummaryResult(
+                pmid=article.pmid,
+                title=article.title,
+                summary=summaries[f"{article.pmid}:summary"],
+                pub_date=article.pub_date,
+                hallucination_score=score,
+                questionable_claims=questionable_claims,
+            )
+        )
+
+    unchecked = len(summarized) - len(results)
+    if unchecked:
+        logger.warning("Left out %d summaries whose hallucination check failed", unchecked)
+
+    return results
@@ -0,0 +1,156 @@
+"""
+Token budget planning for the summarization pipeline.
+
+Each article costs two LLM calls (lay summary + hallucination check). Before
+dispatch the planner estimates their prompt and completion tokens from the
+real prompts, orders the work and selects the prefix that fits the configured
+token/cost cap. At run time `BudgetGuard` admits articles one by one against
+actual usage, so underestimates stop the run at the cap rather than past it.
+"""
+import os
+from datetime import date
+
+from pydantic import BaseModel, Field
+
+from .llm_orchestrator import (
+    HALLUCINATION_COMPLETION_TOKENS,
+    LAY_SUMMARY_COMPLETION_TOKENS,
+    USAGE,
+    hallucination_prompt,
+    lay_summary_prompt,
+)
+from .models import PipelineConfig, PubMedArticle
+from .prompts import prompt_text
+from .rate_limiter import estimate_tokens
+from .utils import parse_pub_date
+
+# USD per 1M tokens; defaults are gpt-5-nano list prices
+INPUT_COST_PER_1M = float(os.getenv("OPENAI_INPUT_COST_PER_1M", "0.05"))
+OUTPUT_COST_PER_1M = float(os.getenv("OPENAI_OUTPUT_COST_PER_1M", "0.40"))
+
+# A 4-6 sentence lay summary, used as the summary text in the hallucination prompt
+TYPICAL_SUMMARY = "x" * 4 * 180
+
+
+# Batch API requests are billed at a discount to the realtime price
+BATCH_COST_FACTOR = float(os.getenv("OPENAI_BATCH_COST_FACTOR", "0.5"))
+
+
+def cost(prompt_tokens: int, completion_tokens: int, batch: bool = False) -> float:
+    realtime = (prompt_tokens * INPUT_COST_PER_1M + completion_tokens * OUTPUT_COST_PER_1M) / 1_000_000
+    return realtime * BATCH_COST_FACTOR if batch else realtime
+
+
+class ArticleEstimate(BaseModel):
+    pmid: str
+    prompt_tokens: int
+    completion_tokens: int
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+    @property
+    def cost(self) -> float:
+        return cost(self.prompt_tokens, self.completion_tokens)
+
+
+class BudgetPlan(BaseModel):
+    selected: list[ArticleEstimate] = Field(default_factory=list)
+    deferred: list[str] = Field(default_factory=list)
+
+    @property
+    def prompt_tokens(self) -> int:
+        return sum(e.prompt_tokens for e in self.selected)
+
+    @property
+    def completion_tokens(self) -> int:
+        return sum(e.completion_tokens for e in self.selected)
+
+
+def estimate_article(article: PubMedArticle) -> ArticleEstimate:
+    """Estimated tokens for summarizing and checking one article."""
+    return ArticleEstimate(
+        pmid=article.pmid,
+        prompt_tokens=(
+            estimate_tokens(prompt_text(lay_summary_prompt(article)))
+            + estimate_tokens(prompt_text(hallucination_prompt(article, TYPICAL_SUMMARY)))
+        ),
+        completion_tokens=LAY_SUMMARY_COMPLETION_TOKENS + HALLUCINATION_COMPLETION_TOKENS,
+    )
+
+
+def order_articles(articles: list[PubMedArticle], order: str) -> list[PubMedArticle]:
+    """'relevance' keeps the PubMed search order; 'newest' sorts by publication date."""
+    if order == "newest":
+        return sorted(articles, key=lambda a: parse_pub_date(a.pub_date) or date.min, reverse=True)
+    return list(articles)
+
+
+def _within(config: PipelineConfig, prompt_tokens: int, completion_tokens: int) -> bool:
+    if config.token_budget is not None and prompt_tokens + completion_tokens > config.token_budget:
+        return False
+    if config.cost_budget is not None and cost(prompt_tokens, completion_tokens, config.batch) > config.cost_budget:
+        return False
+    return True
+
+
+def plan_budget(articles: list[PubMedArticle], config: PipelineConfig) -> BudgetPlan:
+    """Order articles and select those whose cumulative estimate fits the caps."""
+    plan = BudgetPlan()
+    for article in order_articles(articles, config.order):
+        estimate = estimate_article(article)
+        if plan.deferred or not _within(
+            config,
+            plan.prompt_tokens + estimate.prompt_tokens,
+            plan.completion_tokens + estimate.completion_tokens,
+        ):
+            # stop at the first article that does not fit so the order is respected
+            plan.deferred.append(article.pmid)
+            continue
+        plan.selected.append(estimate)
+    return plan
+
+
+class BudgetGuard:
+    """
+    Admission control during the run: spent (actual usage since the guard was
+    created) + estimates of in-flight articles + the next estimate must fit.
+    """
+
+    def __init__(self, config: PipelineConfig):
+        self.config = config
+        self.stopped = False
+        self._start_prompt = USAGE.prompt_tokens
+        self._start_completion = USAGE.completion_tokens
+        self._in_flight_prompt = 0
+        self._in_flight_completion = 0
+
+    @property
+    def spent_prompt_tokens(self) -> int:
+        return USAGE.prompt_tokens - self._start_prompt
+
+    @property
+    def spent_completion_tokens(self) -> int:
+        return USAGE.completion_tokens - self._start_completion
+
+    def admit(self, estimate: ArticleEstimate) -> bool:
+        if self.stopped:
+            return False
+
+        if not _within(
+            self.config,
+            self.spent_prompt_tokens + self._in_flight_prompt + estimate.prompt_tokens,
+            self.spent_completion_tokens + self._in_flight_completion + estimate.completion_tokens,
+        ):
+            self.stopped = True
+            return False
+
+        self._in_flight_prompt += estimate.prompt_tokens
+        self._in_flight_completion += estimate.completion_tokens
+        return True
+
+    def settle(self, estimate: ArticleEstimate) -> None:
+        """Call when an admitted article finishes; its actual usage is now in USAGE."""
+        self._in_flight_prompt -= estimate.prompt_tokens
+        self._in_flight_completion -= estimate.completion_tokens
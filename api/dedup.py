@@ -0,0 +1,138 @@
+import re
+import zlib
+from typing import Iterable, Optional, Sequence
+
+import numpy as np
+
+from .models import PubMedArticle
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+_WORD = re.compile(r"\w+")
+
+
+def _shingles(text: str, size: int = 3) -> set[int]:
+    """Hashed word n-grams of the lower-cased text (crc32 is stable across processes)."""
+    words = _WORD.findall(text.lower())
+    if len(words) < size:
+        return {zlib.crc32(" ".join(words).encode("utf-8"))} if words else set()
+
+    return {
+        zlib.crc32(" ".join(words[i:i + size]).encode("utf-8"))
+        for i in range(len(words) - size + 1)
+    }
+
+
+def _jaccard(a: set[int], b: set[int]) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def _lsh_params(threshold: float, num_perm: int) -> tuple[int, int]:
+    """
+    Pick (bands, rows) with bands * rows == num_perm so the LSH S-curve
+    threshold (1 / bands) ** (1 / rows) sits just below the target similarity.
+    Erring low keeps recall high; candidates are verified with exact Jaccard.
+    """
+    best = (num_perm, 1)
+    best_distance = float("inf")
+    for rows in range(1, num_perm + 1):
+        if num_perm % rows:
+            continue
+        bands = num_perm // rows
+        curve_threshold = (1 / bands) ** (1 / rows)
+        if curve_threshold > threshold:
+            continue
+        distance = threshold - curve_threshold
+        if distance < best_distance:
+            best, best_distance = (bands, rows), distance
+    return best
+
+
+class MinHashLSH:
+    """MinHash signatures indexed with banded locality-sensitive hashing."""
+
+    def __init__(self, threshold: float, num_perm: int = 128, seed: int = 1):
+        # a, b < 2**32 and shingles < 2**32 keep a * s + b within uint64 without overflow
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, 1 << 32, size=(num_perm, 1), dtype=np.uint64)
+        self._b = rng.integers(0, 1 << 32, size=(num_perm, 1), dtype=np.uint64)
+        self.bands, self.rows = _lsh_params(threshold, num_perm)
+        self._buckets: list[dict[tuple, list[str]]] = [{} for _ in range(self.bands)]
+
+    def signature(self, shingles: Iterable[int]) -> list[int]:
+        """All permutations at once: a (num_perm x shingles) hash matrix reduced by row minimum."""
+        values = np.fromiter(shingles, dtype=np.uint64)
+        hashes = ((self._a * values + self._b) % _MERSENNE_PRIME) & _MAX_HASH
+        return hashes.min(axis=1).tolist()
+
+    def _band_keys(self, signature: list[int]) -> list[tuple]:
+        return [
+            tuple(signature[band * self.rows:(band + 1) * self.rows])
+            for band in range(self.bands)
+        ]
+
+    def insert(self, key: str, signature: list[int]) -> None:
+        for bucket, band_key in zip(self._buckets, self._band_keys(signature)):
+            bucket.setdefault(band_key, []).append(key)
+
+    def query(self, signature: list[int]) -> list[str]:
+        """Keys sharing at least one band with the signature, in insertion order."""
+        seen: dict[str, None] = {}
+        for bucket, band_key in zip(self._buckets, self._band_keys(signature)):
+            for key in bucket.get(band_key, []):
+                seen[key] = None
+        return list(seen)
+
+
+def find_near_duplicates(
+    articles: list[PubMedArticle],
+    threshold: Optional[float] = 0.9,
+    num_perm: int = 128,
+    known: Sequence[PubMedArticle] = (),
+) -> dict[str, str]:
+    """
+    Map the PMID of every near-duplicate abstract to its canonical PMID.
+
+    The first article of a group (in input order, i.e. search relevance) is
+    canonical. LSH only proposes candidates; a pair is linked when the exact
+    Jaccard similarity of their word 3-gram shingles is >= threshold.
+    Articles in `known` (e.g. summarized by an earlier run) come first as
+    canonical candidates and are never reported as duplicates themselves.
+    Passing threshold=None disables deduplication.
+    """
+    if threshold is None or not articles or len(articles) + len(known) < 2:
+        return {}
+
+    index = MinHashLSH(threshold, num_perm=num_perm)
+    canonical_shingles: dict[str, set[int]] = {}
+    duplicates: dict[str, str] = {}
+
+    for article in known:
+        shingles = _shingles(article.abstract)
+        if shingles and article.pmid not in canonical_shingles:
+            index.insert(article.pmid, index.signature(shingles))
+            canonical_shingles[article.pmid] = shingles
+
+    for article in articles:
+        shingles = _shingles(article.abstract)
+        if not shingles or article.pmid in canonical_shingles:
+            continue
+
+        signature = index.signature(shingles)
+        match = next(
+            (
+                pmid for pmid in index.query(signature)
+                if _jaccard(shingles, canonical_shingles[pmid]) >= threshold
+            ),
+            None,
+        )
+        if match is not None:
+            duplicates[article.pmid] = match
+            continue
+
+        index.insert(article.pmid, signature)
+        canonical_shingles[article.pmid] = shingles
+
+    return duplicates
@@ -0,0 +1,146 @@
+"""
+Persistent per-month digests of the summaries.
+
+Each digest condenses the summaries of one publication month and is keyed by
+a hash of its member summaries, so after new papers are added only the months
+whose members changed are regenerated. Trend articles can then be written
+from the digests, keeping the prompt size flat as the corpus grows.
+
+No LLM call sees more than CHUNK_SIZE summaries: a larger month is digested
+in chunks (in PMID order, so new papers mostly land in the last chunk), and
+the chunk digests are merged, level by level, into the month's digest. Chunk
+digests are stored with a hash of their inputs and reused while it matches.
+"""
+import asyncio
+import functools
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Optional
+
+from .llm_orchestrator import generate_period_digest, merge_period_digests
+from .models import DigestChunk, PeriodDigest, PipelineConfig, SummaryResult
+from .tracing import traced
+from .utils import load_period_digests, parse_pub_date
+
+DATA_DIR = Path(os.getenv("DATA_DIR", "data"))
+UNDATED = "undated"
+
+# Most summaries or chunk digests condensed by one LLM call
+CHUNK_SIZE = int(os.getenv("DIGEST_CHUNK_SIZE", "50"))
+
+logger = logging.getLogger(__name__)
+
+
+def period_key(pub_date: Optional[str]) -> str:
+    parsed = parse_pub_date(pub_date)
+    return parsed.strftime("%Y-%m") if parsed else UNDATED
+
+
+def _hash(payload: list) -> str:
+    return hashlib.sha256(json.dumps(payload, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def members_hash(summaries: list[SummaryResult]) -> str:
+    """Order-independent hash of the (pmid, summary) pairs in a period."""
+    return _hash(sorted((s.pmid, s.summary) for s in summaries))
+
+
+def group_by_period(summaries: list[SummaryResult]) -> dict[str, list[SummaryResult]]:
+    """Group summaries by publication month, leaving out near-duplicates."""
+    groups: dict[str, list[SummaryResult]] = {}
+    for summary in summaries:
+        if summary.duplicate_of:
+            continue
+        groups.setdefault(period_key(summary.pub_date), []).append(summary)
+    return groups
+
+
+def digests_cover(digests: list[PeriodDigest], summaries: list[SummaryResult]) -> bool:
+    """True if the digests were built from exactly the current summaries."""
+    groups = group_by_period(summaries)
+    current = {d.period: d.members_hash for d in digests}
+    return current == {period: members_hash(members) for period, members in groups.items()}
+
+
+def _split(items: list) -> list[list]:
+    return [items[i:i + CHUNK_SIZE] for i in range(0, len(items), CHUNK_SIZE)]
+
+
+async def _condense(
+    period: str,
+    members: list[SummaryResult],
+    cached: dict[str, str],
+) -> tuple[str, list[DigestChunk]]:
+    """
+    Digest one month in calls of at most CHUNK_SIZE inputs. Returns the digest
+    and the chunk digests it was merged from; those in `cached` are reused.
+    """
+    chunks: list[DigestChunk] = []
+
+    async def chunk_digest(key: str, generate) -> str:
+        text = cached.get(key) or await generate()
+        chunks.append(DigestChunk(members_hash=key, digest=text))
+        return text
+
+    # PMIDs grow over time, so papers added later mostly change only the last chunk
+    ordered = sorted(members, key=lambda s: (len(s.pmid), s.pmid))
+    if len(ordered) <= CHUNK_SIZE:
+        return await generate_period_digest(period, ordered), []
+
+    texts = await asyncio.gather(*(
+        chunk_digest(members_hash(part), functools.partial(generate_period_digest, period, part))
+        for part in _split(ordered)
+    ))
+    while len(texts) > CHUNK_SIZE:
+        texts = await asyncio.gather(*(
+            chunk_digest(_hash(part), functools.partial(merge_period_digests, period, part))
+            for part in _split(list(texts))
+        ))
+    return await merge_period_digests(period, list(texts)), sorted(chunks, key=lambda c: c.members_hash)
+
+
+@traced()
+async def update_period_digests(
+    summaries: list[SummaryResult],
+    config: PipelineConfig,
+) -> list[PeriodDigest]:
+    """
+    Regenerate digests only for months whose member summaries changed, drop
+    months that no longer have members, and write data/pubmed_digests_{year}.json.
+    """
+    try:
+        existing = {d.period: d for d in load_period_digests(config)}
+    except FileNotFoundError:
+        existing = {}
+
+    groups = group_by_period(summaries)
+    hashes = {period: members_hash(members) for period, members in groups.items()}
+    stale = [
+        period for period in sorted(groups)
+        if period not in existing or existing[period].members_hash != hashes[period]
+    ]
+
+    cached = {period: {c.members_hash: c.digest for c in digest.chunks} for period, digest in existing.items()}
+    condensed = await asyncio.gather(*(_condense(p, groups[p], cached.get(p, {})) for p in stale))
+    regenerated = {
+        period: PeriodDigest(
+            period=period,
+            members_hash=hashes[period],
+            pmids=[s.pmid for s in groups[period]],
+            digest=text,
+            chunks=chunks,
+        )
+        for period, (text, chunks) in zip(stale, condensed)
+    }
+
+    digests = [regenerated.get(period) or existing[period] for period in sorted(groups)]
+
+    file_path = DATA_DIR / f"pubmed_digests_{config.year}.json"
+    with file_path.open("w", encoding="utf-8") as fhandle:
+        json.dump([d.model_dump() for d in digests], fhandle, ensure_ascii=False, indent=2)
+
+    logger.info("Regenerated %d of %d monthly digests", len(stale), len(digests))
+    return digests
@@ -1,84 +1,153 @@
 import json
 import os
-from typing import List, Tuple
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple
 
 from langchain_openai import ChatOpenAI
-from langchain_core.messages import HumanMessage
+from langchain_core.messages import BaseMessage
 
-from .models import PubMedArticle, SummaryResult
+from .models import PeriodDigest, PubMedArticle, SummaryResult, TokenUsage
+from .prompts import PromptTemplate, get_template, prompt_text
+from .rate_limiter import BACKGROUND, INTERACTIVE, AdaptiveRateLimiter, InteractiveBeacon, estimate_tokens
+from .tracing import span, traced
 
 OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-5-nano")
+DATA_DIR = Path(os.getenv("DATA_DIR", "data"))
 
+# Retries on 429 are owned by RATE_LIMITER so it can see every rate-limit response
 LLM = ChatOpenAI(
     model=OPENAI_MODEL,
     temperature=0.2,
+    max_retries=0,
+    include_response_headers=True,
 )
 
+RATE_LIMITER = AdaptiveRateLimiter(
+    initial_concurrency=int(os.getenv("OPENAI_INITIAL_CONCURRENCY", "4")),
+    max_concurrency=int(os.getenv("OPENAI_MAX_CONCURRENCY", "32")),
+    # shared by the API and pipeline processes so pipeline work yields to /write-article
+    beacon=InteractiveBeacon(DATA_DIR / "llm_interactive.sqlite"),
+)
 
-async def generate_lay_summary(article: PubMedArticle) -> str:
-    """Generate a 1-paragraph layperson summary of the article abstract (async)."""
-    prompt = f"""
-    You are a medical science writer for the general public.
+# Expected completion sizes, used to reserve token quota before dispatch
+LAY_SUMMARY_COMPLETION_TOKENS = 400
+HALLUCINATION_COMPLETION_TOKENS = 300
+TREND_ARTICLE_COMPLETION_TOKENS = 2000
+VERIFY_COMPLETION_TOKENS = 500
+DIGEST_COMPLETION_TOKENS = 1000
 
-    Write ONE short paragraph (4-6 sentences) in plain English explaining this Covid-19 research article
-    to a high-school-level reader.
+# Actual token usage reported by the API for every call made by this process,
+# in total and per prompt template key (for prompt cache hit rates)
+USAGE = TokenUsage()
+TEMPLATE_USAGE: dict[str, TokenUsage] = defaultdict(TokenUsage)
 
-    Avoid jargon. If you must use a technical term, briefly define it.
 
-    Make sure you mention:
-    - Who or what the study looked at (epidemiology / population).
-    - Any key risk factors or causes discussed.
-    - How Covid-19 was diagnosed or measured in the study.
-    - What happened over time or outcomes (disease progression / prognosis).
-    - Any prevention or treatment ideas (vaccines, drugs, public health measures, etc.) if mentioned.
+_scoped_usage: ContextVar[Optional[dict[str, TokenUsage]]] = ContextVar("scoped_usage", default=None)
 
-    Do NOT add any information that is not in the abstract.
 
-    ARTICLE METADATA:
-    Title: {article.title}
-    Journal: {article.journal}
-    Publication date: {article.pub_date}
-    PMID: {article.pmid}
+def record_usage(template_key: str, usage_metadata: Optional[dict]) -> None:
+    USAGE.record(usage_metadata)
+    TEMPLATE_USAGE[template_key].record(usage_metadata)
 
-    ABSTRACT:
-    \"\"\"{article.abstract}\"\"\""""
+    scoped = _scoped_usage.get()
+    if scoped is not None:
+        scoped.setdefault(template_key, TokenUsage()).record(usage_metadata)
 
-    response = await LLM.ainvoke([HumanMessage(content=prompt)])
-    return response.content.strip()
 
+@contextmanager
+def track_usage() -> Iterator[dict[str, TokenUsage]]:
+    """
+    Collect per-template usage of the LLM calls awaited inside the block, e.g.
+    one API request, separately from concurrent requests.
+    """
+    usage: dict[str, TokenUsage] = {}
+    token = _scoped_usage.set(usage)
+    try:
+        yield usage
+    finally:
+        _scoped_usage.reset(token)
 
-async def check_hallucinations(article: PubMedArticle, summary: str) -> Tuple[int, List[str]]:
+
+async def _invoke(
+    template: PromptTemplate,
+    messages: List[BaseMessage],
+    completion_tokens: int,
+    priority: int,
+) -> str:
     """
-    Ask the LLM to identify claims in the summary that are NOT supported by the original abstract.
-    Returns (hallucination_score, questionable_claims).
+    Send a rendered prompt to the LLM through the shared rate limiter.
+    Time spent queued in the limiter is the caller's span minus "llm.request".
     """
-    prompt = f"""
-    You are checking a summary for factual accuracy against a source abstract.
+    tokens = estimate_tokens(prompt_text(messages)) + completion_tokens
 
-    TASK:
-    1. Read the original abstract.
-    2. Read the lay summary.
-    3. Identify any statements in the summary that are NOT clearly supported by the abstract.
+    async def request():
+        with span("llm.request", template=template.key, estimated_tokens=tokens):
+            return await LLM.ainvoke(messages)
+
+    response = await RATE_LIMITER.call(request, tokens=tokens, priority=priority)
+    record_usage(template.key, getattr(response, "usage_metadata", None))
+    return response.content.strip()
 
-    Return JSON ONLY in this exact format:
-    {{
-    "hallucination_score": <integer number of questionable or unsupported claims>,
-    "questionable_claims": [
-        "claim 1 text",
-        "claim 2 text"
-    ]
-    }}
 
-    ORIGINAL ABSTRACT:
-    \"\"\"{article.abstract}\"\"\"
+def _summaries_block(summaries: List[SummaryResult]) -> str:
+    """Join summaries for a prompt, skipping near-duplicates that reuse another summary."""
+    return "\n".join(s.summary for s in summaries if not s.duplicate_of)
 
 
-    SUMMARY:
-    \"\"\"{summary}\"\"\""""
+def _source_block(summaries: List[SummaryResult], digests: Optional[List[PeriodDigest]]) -> str:
+    """Per-month digests when available (compact, incremental), else the raw summaries."""
+    if digests:
+        block = "\n\n".join(f"[{d.period}, {len(d.pmids)} studies]\n{d.digest}" for d in digests)
+    else:
+        block = _summaries_block(summaries)
+    return f"STUDY SUMMARIES:\n{block}"
 
-    response = await LLM.ainvoke([HumanMessage(content=prompt)])
-    raw = response.content.strip()
 
+def lay_summary_prompt(article: PubMedArticle) -> List[BaseMessage]:
+    """Messages for `generate_lay_summary`; also used for token estimates and batches."""
+    return get_template("lay_summary").render(
+        title=article.title,
+        journal=article.journal,
+        pub_date=article.pub_date,
+        pmid=article.pmid,
+        abstract=article.abstract,
+    )
+
+
+@traced()
+async def generate_lay_summary(article: PubMedArticle, priority: int = BACKGROUND) -> str:
+    """Generate a 1-paragraph layperson summary of the article abstract (async)."""
+    messages = lay_summary_prompt(article)
+    return await _invoke(get_template("lay_summary"), messages, LAY_SUMMARY_COMPLETION_TOKENS, priority)
+
+
+def hallucination_prompt(article: PubMedArticle, summary: str) -> List[BaseMessage]:
+    """Messages for `check_hallucinations`; also used for token estimates and batches."""
+    return get_template("hallucination_check").render(abstract=article.abstract, summary=summary)
+
+
+@traced()
+async def check_hallucinations(
+    article: PubMedArticle,
+    summary: str,
+    priority: int = BACKGROUND,
+) -> Tuple[int, List[str]]:
+    """
+    Ask the LLM to identify claims in the summary that are NOT supported by the original abstract.
+    Returns (hallucination_score, questionable_claims).
+    """
+    messages = hallucination_prompt(article, summary)
+    raw = await _invoke(
+        get_template("hallucination_check"), messages, HALLUCINATION_COMPLETION_TOKENS, priority
+    )
+    return parse_hallucination_response(raw)
+
+
+def parse_hallucination_response(raw: str) -> Tuple[int, List[str]]:
+    """Parse the JSON returned for `hallucination_prompt`; (0, []) if it is malformed."""
     try:
         data = json.loads(raw)
         score = int(data.get("hallucination_score", 0))
@@ -88,97 +157,75 @@ async def check_hallucinations(article: PubMedArticle, summary: str) -> Tuple[in
         return 0, []
 
 
-async def generate_trend_article(title: str, summaries: List[SummaryResult]) -> str:
-    """
-    Generate an article in plain English
+@traced()
+async def generate_trend_article(
+    title: str,
+    summaries: List[SummaryResult],
+    digests: Optional[List[PeriodDigest]] = None,
+    priority: int = INTERACTIVE,
+) -> str:
     """
-    article_summaries = "\n".join(s.summary for s in summaries)
-
-    prompt = f"""
-    You are writing an educational article for the general public.
-
-    Write an article titled: "{title}".
-
-    Use only the information from the study summaries below. Do NOT invent facts.
-
-    GOALS:
-    - Explain in plain English what patterns you see across these studies.
-    - Highlight similarities and differences in:
-    - Who was studied (populations, locations).
-    - Risk factors and causes.
-    - How Covid-19 was diagnosed or measured.
-    - Disease progression and outcomes.
-    - Prevention strategies and treatments studied.
-    - Comment on trends across the year (for example: early vs later studies),
-    but only if you can infer that from the publication dates or summaries.
-    - Avoid speculation unless the summaries clearly mention it.
-    - Use a friendly, accessible tone.
-
-    Length: about 800–1200 words.
-
-    STUDY SUMMARIES:
-    {article_summaries}
+    Generate an article in plain English.
+    If per-month digests of the summaries are given, they are used instead.
     """
-
-    response = await LLM.ainvoke([HumanMessage(content=prompt)])
-    return response.content.strip()
+    template = get_template("trend_article")
+    messages = template.render(context=_source_block(summaries, digests), title=title)
+    return await _invoke(template, messages, TREND_ARTICLE_COMPLETION_TOKENS, priority)
 
 
+@traced()
 async def verify_trend_article(
     trend_article_text: str,
     summaries: List[SummaryResult],
+    digests: Optional[List[PeriodDigest]] = None,
+    priority: int = INTERACTIVE,
 ) -> List[str]:
     """
     Accuracy guard:
     - Ask the LLM to find statements in the trend article that are NOT supported
-      by any of the individual summaries.
+      by any of the individual summaries (or their per-month digests, if given).
     - Return a list of unsupported claims.
+    The prompt starts with the same prefix as `generate_trend_article`, so it is
+    mostly served from the provider's prompt cache.
     """
-    article_summaries = "\n".join(s.summary for s in summaries)
-
-    prompt = f"""
-    You are an accuracy checker.
-
-    You are given:
-    1. A long-form article about 'Trends in Covid Research in 2020'.
-    2. A set of study summaries that were used to create that article.
-
-    Your job:
-    - Identify any specific factual claims in the article that are NOT clearly supported by ANY of the summaries.
-    - A "claim" could be a statement about:
-    - who was affected,
-    - where something happened,
-    - risk factors,
-    - diagnostic tools,
-    - treatments,
-    - outcomes,
-    - or trends over time.
-
-    Important:
-    - If a claim is even loosely supported by more than one summary, consider it supported.
-    - Only flag statements that truly appear speculative or unsupported.
-
-    Return JSON ONLY in this exact format:
-    {{
-    "unsupported_claims": [
-        "claim 1 text",
-        "claim 2 text"
-    ]
-    }}
-
-    ARTICLE:
-    \"\"\"{trend_article_text}\"\"\"
-
-
-    SUMMARIES:
-    {article_summaries}
-    """
-
-    response = await LLM.ainvoke([HumanMessage(content=prompt)])
-    raw = response.content.strip()
+    template = get_template("verify_trend_article")
+    messages = template.render(context=_source_block(summaries, digests), article=trend_article_text)
+    raw = await _invoke(template, messages, VERIFY_COMPLETION_TOKENS, priority)
 
     try:
         data = json.loads(raw)
         return [str(c) for c in data.get("unsupported_claims", [])]
     except Exception:
         return []
+
+
+@traced()
+async def generate_period_digest(
+    period: str,
+    summaries: List[SummaryResult],
+    priority: int = BACKGROUND,
+) -> str:
+    """
+    Condense the summaries of one publication month into a compact digest that
+    can stand in for them when writing and verifying trend articles.
+    """
+    template = get_template("period_digest")
+    messages = template.render(
+        period=period,
+        summaries="\n".join(f"[PMID {s.pmid}] {s.summary}" for s in summaries),
+    )
+    return await _invoke(template, messages, DIGEST_COMPLETION_TOKENS, priority)
+
+
+async def merge_period_digests(
+    period: str,
+    digests: List[str],
+    priority: int = BACKGROUND,
+) -> str:
+    """Merge digests of parts of one month's summaries into a single digest."""
+    template = get_template("merge_period_digests")
+    messages = template.render(
+        period=period,
+        digests="\n\n".join(f"[Part {i}]\n{digest}" for i, digest in enumerate(digests, start=1)),
+    )
+    return await _invoke(template, messages, DIGEST_COMPLETION_TOKENS, priority)
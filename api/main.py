@@ -1,16 +1,33 @@
-from fastapi import FastAPI
+import logging
+from datetime import date
+from typing import Optional
+
+from fastapi import FastAPI, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 
 from .models import (
     PipelineConfig,
     TrendArticle,
-    Article
+    Article,
+    ArticleFilter,
+    Facets,
+    IndexedArticle,
+    SearchPage,
+    UsageReport,
 )
 from .llm_orchestrator import (
+    TEMPLATE_USAGE,
+    USAGE,
     generate_trend_article,
+    track_usage,
     verify_trend_article,
 )
-from .utils import load_pubmed_summaries
+from .digests import digests_cover
+from .search_index import facets, filtered_summaries, get_article, search
+from .utils import load_period_digests, load_pubmed_summaries
+
+logger = logging.getLogger(__name__)
 
 app = FastAPI(
     title="Covid PubMed LLM App",
@@ -32,17 +49,105 @@ async def health():
     return {"status": "ok"}
 
 
+@app.get("/usage", response_model=UsageReport, tags=["meta"])
+async def usage():
+    """LLM token usage since the API started, with prompt cache hit rates per template."""
+    return UsageReport(total=USAGE, templates=dict(TEMPLATE_USAGE))
+
+
+def _article_filter(
+    q: Optional[str] = None,
+    journal: Optional[str] = None,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+) -> ArticleFilter:
+    return ArticleFilter(keywords=q, journal=journal, date_from=date_from, date_to=date_to)
+
+
+# The index is queried with blocking sqlite3 calls, so these endpoints are sync
+# and FastAPI runs them in its threadpool
+@app.get("/articles", response_model=SearchPage, tags=["articles"])
+def search_articles(
+    q: Optional[str] = None,
+    journal: Optional[str] = None,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    page: int = Query(1, ge=1),
+    page_size: int = Query(20, ge=1, le=100),
+):
+    config = PipelineConfig()
+    article_filter = _article_filter(q, journal, date_from, date_to)
+    try:
+        return search(config, article_filter, page=page, page_size=page_size)
+    except FileNotFoundError as exc:
+        raise HTTPException(status_code=503, detail=str(exc))
+
+
+@app.get("/articles/facets", response_model=Facets, tags=["articles"])
+def article_facets(
+    q: Optional[str] = None,
+    journal: Optional[str] = None,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+):
+    config = PipelineConfig()
+    try:
+        return facets(config, _article_filter(q, journal, date_from, date_to))
+    except FileNotFoundError as exc:
+        raise HTTPException(status_code=503, detail=str(exc))
+
+
+@app.get("/articles/{pmid}", response_model=IndexedArticle, tags=["articles"])
+def read_article(pmid: str):
+    config = PipelineConfig()
+    try:
+        article = get_article(config, pmid)
+    except FileNotFoundError as exc:
+        raise HTTPException(status_code=503, detail=str(exc))
+    if article is None:
+        raise HTTPException(status_code=404, detail=f"Article {pmid} not found")
+    return article
+
+
 @app.post("/write-article", response_model=TrendArticle, tags=["write-article"])
 async def write_article(article: Article):
     # TODO: Extract year from article title and feed into pipeline config
     config = PipelineConfig()
-    summaries = load_pubmed_summaries(config)
 
-    # Generate article
-    trend_article_body = await generate_trend_article(article.title, summaries)
+    if article.filter is not None:
+        # Narrow the corpus in the search index; the digests cover all summaries, so skip them
+        try:
+            summaries = await run_in_threadpool(filtered_summaries, config, article.filter)
+        except FileNotFoundError as exc:
+            raise HTTPException(status_code=503, detail=str(exc))
+        if not summaries:
+            raise HTTPException(status_code=404, detail="No summaries match the filter")
+        digests = None
+    else:
+        summaries = load_pubmed_summaries(config)
+
+        # Use the per-month digests when they are up to date with the summaries
+        try:
+            digests = load_period_digests(config)
+        except FileNotFoundError:
+            digests = None
+        if digests and not digests_cover(digests, summaries):
+            digests = None
+
+    with track_usage() as request_usage:
+        # Generate article
+        trend_article_body = await generate_trend_article(article.title, summaries, digests=digests)
+
+        # Perform accuracy guard for trends article; its prompt shares the cached prefix
+        unsupported_claims = await verify_trend_article(trend_article_body, summaries, digests=digests)
 
-    # Perform accuracy guard for trends article
-    unsupported_claims = await verify_trend_article(trend_article_body, summaries)
+    for key, template_usage in request_usage.items():
+        logger.info(
+            "write-article %s: %d of %d prompt tokens cached",
+            key,
+            template_usage.cached_prompt_tokens,
+            template_usage.prompt_tokens,
+        )
     trend = TrendArticle(
         title=article.title,
         body=trend_article_body,
@@ -1,5 +1,6 @@
-from typing import List, Optional
-from pydantic import BaseModel, Field
+from datetime import date
+from typing import List, Literal, Optional
+from pydantic import BaseModel, Field, computed_field
 
 
 class PubMedArticle(BaseModel):
@@ -14,12 +15,78 @@ class SummaryResult(BaseModel):
     pmid: str
     title: str
     summary: str
+    pub_date: Optional[str] = None
     hallucination_score: int = 0
     questionable_claims: List[str] = Field(default_factory=list)
+    duplicate_of: Optional[str] = None   # canonical PMID whose summary was reused
+
+
+class SummarizeOutcome(BaseModel):
+    summaries: List[SummaryResult] = Field(default_factory=list)
+    failed: List[str] = Field(default_factory=list)   # PMIDs whose LLM calls failed, with their near-duplicates
+    deferred: List[str] = Field(default_factory=list)   # PMIDs left out by the token/cost budget, likewise
+
+
+class DigestChunk(BaseModel):
+    members_hash: str   # hash of the summaries (or chunk digests) it condenses
+    digest: str
+
+
+class PeriodDigest(BaseModel):
+    period: str   # publication month, "YYYY-MM", or "undated"
+    members_hash: str   # hash of the member summaries the digest was generated from
+    pmids: List[str]
+    digest: str
+    chunks: List[DigestChunk] = Field(default_factory=list)   # partial digests of large months
+
+
+class ArticleFilter(BaseModel):
+    keywords: Optional[str] = None   # all words must appear in title, abstract, summary or journal
+    journal: Optional[str] = None
+    date_from: Optional[date] = None
+    date_to: Optional[date] = None
 
 
 class Article(BaseModel):
     title: str
+    filter: Optional[ArticleFilter] = None   # narrow the summaries the article is written from
+
+
+class IndexedArticle(BaseModel):
+    pmid: str
+    title: str
+    abstract: str
+    journal: Optional[str] = None
+    pub_date: Optional[str] = None
+    summary: Optional[str] = None
+    hallucination_score: Optional[int] = None
+    questionable_claims: List[str] = Field(default_factory=list)
+    duplicate_of: Optional[str] = None
+
+
+class SearchHit(BaseModel):
+    pmid: str
+    title: str
+    journal: Optional[str] = None
+    pub_date: Optional[str] = None
+    snippet: Optional[str] = None
+
+
+class SearchPage(BaseModel):
+    total: int
+    page: int
+    page_size: int
+    results: List[SearchHit] = Field(default_factory=list)
+
+
+class FacetCount(BaseModel):
+    value: str
+    count: int
+
+
+class Facets(BaseModel):
+    journals: List[FacetCount] = Field(default_factory=list)
+    months: List[FacetCount] = Field(default_factory=list)
 
 
 class TrendArticle(BaseModel):
@@ -33,6 +100,11 @@ class PipelineConfig(BaseModel):
     year: int = 2020
     retmax: int = 30   # 25–50 per brief
     force_refresh: bool = False   # re-fetch from PubMed ignoring local cache
+    dedup_threshold: Optional[float] = 0.9   # abstract similarity for near-duplicates; None disables
+    token_budget: Optional[int] = None   # stop summarizing once this many tokens would be spent
+    cost_budget: Optional[float] = None   # same, in USD
+    order: Literal["relevance", "newest"] = "relevance"   # which articles to summarize first
+    batch: bool = False   # summarize through the OpenAI Batch API instead of realtime calls
 
 
 class PipelineResult(BaseModel):
@@ -40,3 +112,39 @@ class PipelineResult(BaseModel):
     total_articles: int
     summaries: List[SummaryResult]
     trend_article: TrendArticle
+
+
+class WorkUnit(BaseModel):
+    id: int
+    pmids: List[str]
+    attempts: int = 0
+
+
+class TokenUsage(BaseModel):
+    calls: int = 0
+    prompt_tokens: int = 0
+    cached_prompt_tokens: int = 0   # prompt tokens served from the provider's prompt cache
+    completion_tokens: int = 0
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+    @computed_field
+    @property
+    def cache_hit_rate(self) -> float:
+        return self.cached_prompt_tokens / self.prompt_tokens if self.prompt_tokens else 0.0
+
+    def record(self, usage_metadata: Optional[dict]) -> None:
+        """Add the usage reported on a LangChain AIMessage (`usage_metadata`)."""
+        self.calls += 1
+        if usage_metadata:
+            self.prompt_tokens += usage_metadata.get("input_tokens", 0)
+            self.completion_tokens += usage_metadata.get("output_tokens", 0)
+            details = usage_metadata.get("input_token_details") or {}
+            self.cached_prompt_tokens += details.get("cache_read", 0) or 0
+
+
+class UsageReport(BaseModel):
+    total: TokenUsage
+    templates: dict[str, TokenUsage] = Field(default_factory=dict)   # keyed by "name@vN"
@@ -0,0 +1,232 @@
+"""
+Versioned prompt templates laid out for provider prompt caching.
+
+OpenAI caches the longest previously seen prompt prefix (in 128-token steps
+past the first 1024 tokens), so each template renders as:
+
+1. a system message with the static instructions, byte-identical on every call;
+2. optionally, a shared context message (e.g. the study summaries), identical
+   across the calls that share it;
+3. a final user message with the static task text, then the per-call content.
+
+The trend-writing and verification templates share both the system message
+and the summaries context, so verifying an article reuses the prefix cached
+while writing it. Bump a template's version whenever its text changes, so
+token usage recorded per template key stays comparable.
+"""
+from typing import Optional
+
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
+from pydantic import BaseModel
+
+
+class PromptTemplate(BaseModel):
+    name: str
+    version: int
+    instructions: str     # static system message
+    task: str = ""        # static text placed after the shared context
+    input: str            # per-call content, formatted with the render() values
+
+    @property
+    def key(self) -> str:
+        return f"{self.name}@v{self.version}"
+
+    def render(self, context: Optional[str] = None, **values: object) -> list[BaseMessage]:
+        messages: list[BaseMessage] = [SystemMessage(content=self.instructions)]
+        if context is not None:
+            messages.append(HumanMessage(content=context))
+
+        per_call = self.input.format(**values)
+        messages.append(HumanMessage(content=f"{self.task}\n\n{per_call}" if self.task else per_call))
+        return messages
+
+
+REGISTRY: dict[str, PromptTemplate] = {}
+
+
+def register(template: PromptTemplate) -> PromptTemplate:
+    if template.key in REGISTRY:
+        raise ValueError(f"Prompt template '{template.key}' is already registered")
+    REGISTRY[template.key] = template
+    return template
+
+
+def get_template(name: str, version: Optional[int] = None) -> PromptTemplate:
+    """A specific version of a template, or its latest version."""
+    versions = [t for t in REGISTRY.values() if t.name == name]
+    if version is not None:
+        versions = [t for t in versions if t.version == version]
+    if not versions:
+        raise KeyError(f"No prompt template '{name}'" + (f" version {version}" if version else ""))
+    return max(versions, key=lambda t: t.version)
+
+
+def prompt_text(messages: list[BaseMessage]) -> str:
+    """All message contents joined, for token estimates."""
+    return "\n\n".join(str(m.content) for m in messages)
+
+
+register(PromptTemplate(
+    name="lay_summary",
+    version=1,
+    instructions="""You are a medical science writer for the general public.
+
+Write ONE short paragraph (4-6 sentences) in plain English explaining the Covid-19 research article
+in the user's message to a high-school-level reader.
+
+Avoid jargon. If you must use a technical term, briefly define it.
+
+Make sure you mention:
+- Who or what the study looked at (epidemiology / population).
+- Any key risk factors or causes discussed.
+- How Covid-19 was diagnosed or measured in the study.
+- What happened over time or outcomes (disease progression / prognosis).
+- Any prevention or treatment ideas (vaccines, drugs, public health measures, etc.) if mentioned.
+
+Do NOT add any information that is not in the abstract.""",
+    input='''ARTICLE METADATA:
+Title: {title}
+Journal: {journal}
+Publication date: {pub_date}
+PMID: {pmid}
+
+ABSTRACT:
+"""{abstract}"""''',
+))
+
+register(PromptTemplate(
+    name="hallucination_check",
+    version=1,
+    instructions="""You are checking a summary for factual accuracy against a source abstract.
+
+TASK:
+1. Read the original abstract.
+2. Read the lay summary.
+3. Identify any statements in the summary that are NOT clearly supported by the abstract.
+
+Return JSON ONLY in this exact format:
+{
+"hallucination_score": <integer number of questionable or unsupported claims>,
+"questionable_claims": [
+    "claim 1 text",
+    "claim 2 text"
+]
+}""",
+    input='''ORIGINAL ABSTRACT:
+"""{abstract}"""
+
+
+SUMMARY:
+"""{summary}"""''',
+))
+
+# Shared by trend_article and verify_trend_article so both calls have the same prefix
+_TREND_INSTRUCTIONS = """You write and fact-check educational articles about Covid-19 research for the general public.
+
+The study summaries in the next message are the only source of facts. They are either one plain-English
+summary per study, or digests of the summaries published in one month, labelled [YYYY-MM, N studies]."""
+
+register(PromptTemplate(
+    name="trend_article",
+    version=1,
+    instructions=_TREND_INSTRUCTIONS,
+    task="""Write an educational article for the general public.
+
+Use only the information from the study summaries above. Do NOT invent facts.
+
+GOALS:
+- Explain in plain English what patterns you see across these studies.
+- Highlight similarities and differences in:
+- Who was studied (populations, locations).
+- Risk factors and causes.
+- How Covid-19 was diagnosed or measured.
+- Disease progression and outcomes.
+- Prevention strategies and treatments studied.
+- Comment on trends across the year (for example: early vs later studies),
+but only if you can infer that from the publication dates or summaries.
+- Avoid speculation unless the summaries clearly mention it.
+- Use a friendly, accessible tone.
+
+Length: about 800–1200 words.""",
+    input='Write an article titled: "{title}".',
+))
+
+register(PromptTemplate(
+    name="verify_trend_article",
+    version=1,
+    instructions=_TREND_INSTRUCTIONS,
+    task="""You are an accuracy checker.
+
+You are given:
+1. A long-form article about trends in Covid research, below.
+2. The study summaries above, which were used to create that article.
+
+Your job:
+- Identify any specific factual claims in the article that are NOT clearly supported by ANY of the summaries.
+- A "claim" could be a statement about:
+- who was affected,
+- where something happened,
+- risk factors,
+- diagnostic tools,
+- treatments,
+- outcomes,
+- or trends over time.
+
+Important:
+- If a claim is even loosely supported by more than one summary, consider it supported.
+- Only flag statements that truly appear speculative or unsupported.
+
+Return JSON ONLY in this exact format:
+{
+"unsupported_claims": [
+    "claim 1 text",
+    "claim 2 text"
+]
+}""",
+    input='''ARTICLE:
+"""{article}"""''',
+))
+
+register(PromptTemplate(
+    name="period_digest",
+    version=1,
+    instructions="""You are condensing plain-English summaries of Covid-19 studies published in one month.
+
+Write a compact digest (at most about 250 words) that keeps every concrete finding a
+reader might rely on:
+- Who was studied (populations, locations) and how many studies looked at them.
+- Risk factors and causes.
+- How Covid-19 was diagnosed or measured.
+- Disease progression and outcomes.
+- Prevention strategies and treatments studied.
+
+Merge findings shared by several studies into one statement. Do NOT add anything
+that is not in the summaries, and do not drop findings that only one study reports.""",
+    input="""PUBLICATION MONTH: {period}
+
+STUDY SUMMARIES:
+{summaries}""",
+))
+
+register(PromptTemplate(
+    name="merge_period_digests",
+    version=1,
+    instructions="""You are merging partial digests of the plain-English summaries of Covid-19 studies
+published in one month. Each part condenses a different set of studies.
+
+Write one compact digest (at most about 250 words) that keeps every concrete finding a
+reader might rely on:
+- Who was studied (populations, locations) and how many studies looked at them;
+  add up the study counts the parts report.
+- Risk factors and causes.
+- How Covid-19 was diagnosed or measured.
+- Disease progression and outcomes.
+- Prevention strategies and treatments studied.
+
+Merge findings shared by several parts into one statement. Do NOT add anything
+that is not in the parts, and do not drop findings that only one part reports.""",
+    input="""PUBLICATION MONTH: {period}
+
+PARTIAL DIGESTS:
+{digests}""",
+))
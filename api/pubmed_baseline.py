@@ -0,0 +1,245 @@
+"""
+Offline ingestion of PubMed baseline/update files (pubmed*.xml.gz).
+
+Files are downloaded separately from https://ftp.ncbi.nlm.nih.gov/pubmed/baseline/
+and .../updatefiles/. Each file is decompressed and parsed incrementally, so
+memory stays flat regardless of file size, and files are parsed in parallel
+across a process pool.
+"""
+import gzip
+import json
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from pathlib import Path
+from typing import Iterable, Iterator, Optional
+
+from xml.etree import ElementTree as ET
+
+from .models import PubMedArticle, PipelineConfig
+from . import tracing
+from .tracing import traced
+
+DATA_DIR = Path(os.getenv("DATA_DIR", "data"))
+
+_FIELD_TERM = re.compile(r'("[^"]+"|[^\s()"\[\]]+)\[([^\]]+)\]')
+_TITLE_FIELDS = {"title", "ti"}
+_ABSTRACT_FIELDS = {"abstract", "ab"}
+_TITLE_ABSTRACT_FIELDS = {"title/abstract", "tiab"}
+_OPERATORS = {"AND", "OR", "NOT"}
+
+
+def _query_terms(query: str) -> list[tuple[str, tuple[str, ...]]]:
+    """
+    Extract (term, fields) pairs from a PubMed query such as
+    'covid-19[Title/Abstract] OR sars-cov-2[tiab]'.
+
+    Only the OR-of-terms subset of PubMed syntax is supported: a record matches
+    if any term occurs in any of its fields. A query without field tags is
+    treated as a single phrase searched in title and abstract. Anything else
+    (AND, NOT, untagged terms next to tagged ones, other field tags) raises
+    ValueError rather than selecting a different corpus than esearch would.
+    """
+    terms = []
+    for term, field in _FIELD_TERM.findall(query):
+        field = field.strip().lower()
+        if field in _TITLE_FIELDS:
+            fields = ("title",)
+        elif field in _ABSTRACT_FIELDS:
+            fields = ("abstract",)
+        elif field in _TITLE_ABSTRACT_FIELDS:
+            fields = ("title", "abstract")
+        else:
+            raise ValueError(f"Field tag [{field}] in query '{query}' cannot be matched offline")
+        terms.append((term.strip('"').lower(), fields))
+
+    # what is left between the tagged terms may only be OR and grouping parentheses
+    rest = _FIELD_TERM.sub(" ", query).replace("(", " ").replace(")", " ").split()
+    if terms:
+        unsupported = [token for token in rest if token != "OR"]
+    else:
+        unsupported = [token for token in rest if token in _OPERATORS]
+    if unsupported or (not terms and re.search(r"[()]", query)):
+        raise ValueError(
+            f"Query '{query}' is not supported offline: only terms tagged [Title/Abstract], "
+            "[tiab], [ti] or [ab] joined by OR can be matched"
+        )
+
+    if not terms and query.strip():
+        terms.append((query.strip().strip('"').lower(), ("title", "abstract")))
+
+    return terms
+
+
+def _matches(article: PubMedArticle, terms: list[tuple[str, tuple[str, ...]]]) -> bool:
+    if not terms:
+        return True
+
+    text = {"title": article.title.lower(), "abstract": article.abstract.lower()}
+    return any(term in text[field] for term, fields in terms for field in fields)
+
+
+def _text(elem: Optional[ET.Element]) -> str:
+    return "".join(elem.itertext()).strip() if elem is not None else ""
+
+
+def _pub_date(citation: ET.Element) -> tuple[Optional[int], Optional[str]]:
+    """Publication year and an esummary-style date string ('2020 Mar 15')."""
+    pub_date = citation.find("./Article/Journal/JournalIssue/PubDate")
+    if pub_date is None:
+        return None, None
+
+    medline_date = pub_date.findtext("MedlineDate")
+    if medline_date:
+        match = re.match(r"\d{4}", medline_date)
+        return (int(match.group()) if match else None), medline_date
+
+    parts = [pub_date.findtext(tag) for tag in ("Year", "Month", "Day")]
+    year = parts[0]
+    return (int(year) if year and year.isdigit() else None), " ".join(p for p in parts if p) or None
+
+
+def _parse_citation(elem: ET.Element) -> Optional[PubMedArticle]:
+    citation = elem.find("MedlineCitation")
+    if citation is None:
+        return None
+
+    pmid = citation.findtext("PMID")
+    if not pmid:
+        return None
+
+    abstract = " ".join(
+        _text(part) for part in citation.findall("./Article/Abstract/AbstractText")
+    ).strip()
+    _, pub_date = _pub_date(citation)
+
+    return PubMedArticle(
+        pmid=pmid,
+        title=_text(citation.find("./Article/ArticleTitle")),
+        abstract=abstract,
+        pub_date=pub_date,
+        journal=citation.findtext("./Article/Journal/Title"),
+    )
+
+
+def parse_baseline_file(
+    path: Path,
+    terms: list[tuple[str, tuple[str, ...]]],
+    year: Optional[int],
+) -> tuple[list[dict], list[str]]:
+    """
+    Stream one .xml.gz file. Returns (matching articles, dropped PMIDs).
+
+    Dropped PMIDs are those deleted by the file or present in it but no longer
+    matching, so a revised record in an update file replaces an earlier match.
+    Articles are returned as dicts so they pickle cheaply across processes.
+    """
+    matched: dict[str, dict] = {}
+    dropped: set[str] = set()
+
+    opener = gzip.open if str(path).endswith(".gz") else open
+    with opener(path, "rb") as fhandle:
+        context = ET.iterparse(fhandle, events=("start", "end"))
+        _, root = next(context)
+
+        for event, elem in context:
+            if event != "end":
+                continue
+
+            if elem.tag == "PubmedArticle":
+                article = _parse_citation(elem)
+                if article is not None:
+                    pub_year, _ = _pub_date(elem.find("MedlineCitation"))
+                    if (year is None or pub_year == year) and article.abstract and _matches(article, terms):
+                        matched[article.pmid] = article.model_dump()
+                        dropped.discard(article.pmid)
+                    else:
+                        matched.pop(article.pmid, None)
+                        dropped.add(article.pmid)
+                # drop parsed records so memory does not grow with the file
+                root.clear()
+            elif elem.tag == "DeleteCitation":
+                for pmid in elem.findall("PMID"):
+                    if pmid.text:
+                        matched.pop(pmid.text, None)
+                        dropped.add(pmid.text)
+                root.clear()
+
+    return list(matched.values()), sorted(dropped)
+
+
+def _timed_parse(
+    path: Path,
+    terms: list[tuple[str, tuple[str, ...]]],
+    year: Optional[int],
+) -> tuple[list[dict], list[str], int, int]:
+    """parse_baseline_file plus its wall-clock span, so the parent process can record it."""
+    start_ns = time.time_ns()
+    matched, dropped = parse_baseline_file(path, terms, year)
+    return matched, dropped, start_ns, time.time_ns()
+
+
+def _record_parses(
+    files: list[Path],
+    parsed: Iterable[tuple[list[dict], list[str], int, int]],
+) -> Iterator[tuple[list[dict], list[str]]]:
+    for path, (matched, dropped, start_ns, end_ns) in zip(files, parsed):
+        tracing.record(
+            "baseline.parse_file", start_ns, end_ns, path=str(path), matched=len(matched), dropped=len(dropped)
+        )
+        yield matched, dropped
+
+
+@traced()
+def ingest_baseline(
+    config: PipelineConfig,
+    paths: Iterable[Path],
+    processes: Optional[int] = None,
+) -> list[PubMedArticle]:
+    """
+    Load all articles matching config.query and config.year from baseline/update
+    files into data/pubmed_articles_{year}.json (the same store as
+    fetch_pubmed_articles). config.retmax is not applied.
+
+    Files are applied in name order, so records in later update files replace
+    earlier versions and DeleteCitation entries remove them.
+    `paths` can come from `baseline_files(directory)`.
+    """
+    files = sorted(Path(p) for p in paths)
+    terms = _query_terms(config.query)
+
+    # parse spans are timed where the file is parsed and recorded here, as worker
+    # processes have their own (discarded) tracer
+    if processes == 1:
+        parsed = map(_timed_parse, files, repeat(terms), repeat(config.year))
+        store = _apply(_record_parses(files, parsed))
+    else:
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            parsed = pool.map(_timed_parse, files, repeat(terms), repeat(config.year))
+            store = _apply(_record_parses(files, parsed))
+
+    articles = [PubMedArticle(**row) for row in store.values()]
+
+    DATA_DIR.mkdir(parents=True, exist_ok=True)
+    file_path = DATA_DIR / f"pubmed_articles_{config.year}.json"
+    with file_path.open("w", encoding="utf-8") as fhandle:
+        json.dump([a.model_dump() for a in articles], fhandle, ensure_ascii=False, indent=2)
+
+    return articles
+
+
+def baseline_files(directory: Path) -> list[Path]:
+    """All PubMed XML files in a directory (baseline and update files can be mixed)."""
+    return sorted(Path(directory).glob("*.xml.gz")) + sorted(Path(directory).glob("*.xml"))
+
+
+def _apply(parsed: Iterable[tuple[list[dict], list[str]]]) -> dict[str, dict]:
+    store: dict[str, dict] = {}
+    for articles, dropped in parsed:
+        for pmid in dropped:
+            store.pop(pmid, None)
+        for row in articles:
+            store[row["pmid"]] = row
+    return store
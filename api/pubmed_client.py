@@ -7,11 +7,13 @@ import httpx
 from xml.etree import ElementTree as ET
 
 from .models import PubMedArticle, PipelineConfig
+from .tracing import span, traced
 
 DATA_DIR = Path(os.getenv("DATA_DIR", "data"))
 DATA_DIR.mkdir(parents=True, exist_ok=True)
 
 
+@traced("pubmed.esearch")
 async def _pubmed_search_ids(config: PipelineConfig) -> list[str]:
     """Search PubMed for PMIDs matching query + year (async)."""
     async with httpx.AsyncClient(timeout=30.0) as client:
@@ -29,6 +31,7 @@ async def _pubmed_search_ids(config: PipelineConfig) -> list[str]:
     return response.json().get("esearchresult", {}).get("idlist", [])
 
 
+@traced("pubmed.esummary")
 async def _pubmed_fetch_summaries(pmids: list[str]) -> dict:
     """Fetch summaries for PMIDs (title, journal, pubdate) asynchronously."""
     if not pmids:
@@ -48,6 +51,7 @@ async def _pubmed_fetch_summaries(pmids: list[str]) -> dict:
     return response.json().get("result", {})
 
 
+@traced("pubmed.efetch")
 async def _pubmed_fetch_abstracts(pmids: list[str]) -> dict:
     """Fetch abstracts for PMIDs asynchronously."""
     if not pmids:
@@ -65,20 +69,22 @@ async def _pubmed_fetch_abstracts(pmids: list[str]) -> dict:
         )
     response.raise_for_status()
 
-    root = ET.fromstring(response.text)
+    with span("pubmed.efetch.parse_xml", bytes=len(response.text)):
+        root = ET.fromstring(response.text)
 
-    abstracts: dict[str, str] = {}
-    for article in root.findall(".//PubmedArticle"):
-        pmid_elem = article.find(".//PMID")
-        pmid = pmid_elem.text if pmid_elem is not None else None
-        abs_elem = article.find(".//Abstract/AbstractText")
-        abstract = abs_elem.text if abs_elem is not None else ""
-        if pmid:
-            abstracts[pmid] = abstract
+        abstracts: dict[str, str] = {}
+        for article in root.findall(".//PubmedArticle"):
+            pmid_elem = article.find(".//PMID")
+            pmid = pmid_elem.text if pmid_elem is not None else None
+            abs_elem = article.find(".//Abstract/AbstractText")
+            abstract = abs_elem.text if abs_elem is not None else ""
+            if pmid:
+                abstracts[pmid] = abstract
 
     return abstracts
 
 
+@traced()
 async def fetch_pubmed_articles(config: PipelineConfig) -> list[PubMedArticle]:
     """
     Fetch ~retmax PubMed articles for the query/year.
@@ -87,6 +93,17 @@ async def fetch_pubmed_articles(config: PipelineConfig) -> list[PubMedArticle]:
     file_path = DATA_DIR / f"pubmed_articles_{config.year}.json"
 
     pmids = await _pubmed_search_ids(config)
+    articles = await fetch_articles_by_pmids(pmids)
+
+    with span("write_json", path=str(file_path)), file_path.open("w", encoding="utf-8") as fhandle:
+        json.dump([a.model_dump() for a in articles], fhandle, ensure_ascii=False, indent=2)
+
+    return articles
+
+
+@traced()
+async def fetch_articles_by_pmids(pmids: list[str]) -> list[PubMedArticle]:
+    """Fetch details for known PMIDs, keeping only those with a non-empty abstract."""
     summaries, abstracts = await _fetch_details(pmids)
 
     if not summaries:
@@ -112,9 +129,6 @@ async def fetch_pubmed_articles(config: PipelineConfig) -> list[PubMedArticle]:
         if article.abstract:
             articles.append(article)
 
-    with file_path.open("w", encoding="utf-8") as fhandle:
-        json.dump([a.model_dump() for a in articles], fhandle, ensure_ascii=False, indent=2)
-
     return articles
 
 
@@ -0,0 +1,342 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import re
+import sqlite3
+import time
+from contextlib import closing
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Mapping, Optional
+
+from openai import APIConnectionError, InternalServerError, RateLimitError
+
+# Lower value is served first
+INTERACTIVE = 0
+BACKGROUND = 1
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_DURATION_UNITS = {"h": 3600.0, "m": 60.0, "s": 1.0, "ms": 0.001}
+
+# Server-side or network failures (APITimeoutError is an APIConnectionError); retried with
+# backoff but, unlike 429s, they say nothing about quota so the concurrency limit is kept
+TRANSIENT_ERRORS = (InternalServerError, APIConnectionError)
+
+logger = logging.getLogger(__name__)
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token estimate for English text (~4 characters per token)."""
+    return max(1, len(text) // 4)
+
+
+def _parse_duration(value: Optional[str]) -> Optional[float]:
+    """Parse OpenAI reset durations such as '1s', '6m0s' or '250ms' into seconds."""
+    if not value:
+        return None
+
+    parts = _DURATION_PART.findall(value)
+    if not parts:
+        try:
+            return float(value)
+        except ValueError:
+            return None
+
+    return sum(float(amount) * _DURATION_UNITS[unit] for amount, unit in parts)
+
+
+def _parse_int(value: Optional[str]) -> Optional[int]:
+    try:
+        return int(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def _retry_after(headers: Mapping[str, str]) -> Optional[float]:
+    """Seconds to wait after a 429, taken from the most precise header available."""
+    retry_after_ms = headers.get("retry-after-ms")
+    if retry_after_ms is not None:
+        try:
+            return float(retry_after_ms) / 1000
+        except ValueError:
+            pass
+
+    return _parse_duration(headers.get("retry-after")) or max(
+        _parse_duration(headers.get("x-ratelimit-reset-requests")) or 0.0,
+        _parse_duration(headers.get("x-ratelimit-reset-tokens")) or 0.0,
+    ) or None
+
+
+class InteractiveBeacon:
+    """
+    Cross-process signal that interactive calls are in flight.
+
+    The API and the pipeline run as separate processes against the same OpenAI
+    quota, so each interactive call registers a row in a small SQLite file
+    (in DATA_DIR) for its duration. Limiters in other processes read it and
+    hold background work back while it is non-empty. Rows expire after `ttl`
+    seconds so a crashed API process cannot stall the pipeline.
+    """
+
+    def __init__(self, path: Path, ttl: float = 300.0, poll_seconds: float = 1.0):
+        self.path = Path(path)
+        self.ttl = ttl
+        self.poll_seconds = poll_seconds
+        self._busy = False
+        self._checked_at = float("-inf")
+
+    def _connect(self) -> sqlite3.Connection:
+        # a connection per operation, so the beacon survives forks into worker processes
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+        conn.execute("CREATE TABLE IF NOT EXISTS interactive (id INTEGER PRIMARY KEY, expires_at REAL NOT NULL)")
+        return conn
+
+    def begin(self) -> Optional[int]:
+        try:
+            with closing(self._connect()) as conn:
+                return conn.execute(
+                    "INSERT INTO interactive (expires_at) VALUES (?)", (time.time() + self.ttl,)
+                ).lastrowid
+        except sqlite3.Error:
+            logger.warning("Could not register interactive call in %s", self.path, exc_info=True)
+            return None
+
+    def end(self, ticket: Optional[int]) -> None:
+        if ticket is None:
+            return
+        try:
+            with closing(self._connect()) as conn:
+                conn.execute("DELETE FROM interactive WHERE id = ? OR expires_at < ?", (ticket, time.time()))
+        except sqlite3.Error:
+            logger.warning("Could not clear interactive call in %s", self.path, exc_info=True)
+
+    def busy(self) -> bool:
+        """True while any process has an interactive call in flight; cached for `poll_seconds`."""
+        now = time.monotonic()
+        if now - self._checked_at < self.poll_seconds:
+            return self._busy
+
+        self._checked_at = now
+        if not self.path.exists():
+            self._busy = False
+            return False
+        try:
+            with closing(self._connect()) as conn:
+                self._busy = conn.execute(
+                    "SELECT EXISTS (SELECT 1 FROM interactive WHERE expires_at > ?)", (time.time(),)
+                ).fetchone()[0] == 1
+        except sqlite3.Error:
+            self._busy = False
+        return self._busy
+
+
+class AdaptiveRateLimiter:
+    """
+    Process-wide scheduler for LLM calls.
+
+    Concurrency is adjusted with AIMD: each successful call grows the limit by
+    1/limit (about +1 per round of calls), each 429 - or a response whose
+    rate-limit headers show less than `headroom` of the quota left - halves it.
+    The `x-ratelimit-remaining-tokens` header is used to hold back calls whose
+    estimated token cost would not fit before the window resets.
+
+    Waiting calls are served by priority (INTERACTIVE before BACKGROUND), then FIFO.
+    With a shared `beacon`, interactive calls in any process (e.g. the API) also
+    hold this limiter's BACKGROUND calls to `min_concurrency` while they run.
+    Transient server/network errors are retried with backoff without changing the limit.
+    The limiter is not thread-safe; use one instance per process/event loop thread.
+    """
+
+    def __init__(
+        self,
+        initial_concurrency: int = 4,
+        min_concurrency: int = 1,
+        max_concurrency: int = 32,
+        decrease_factor: float = 0.5,
+        headroom: float = 0.1,
+        max_attempts: int = 5,
+        base_backoff: float = 1.0,
+        beacon: Optional[InteractiveBeacon] = None,
+    ):
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.decrease_factor = decrease_factor
+        self.headroom = headroom
+        self.max_attempts = max_attempts
+        self.base_backoff = base_backoff
+        self.beacon = beacon
+
+        self.limit = float(initial_concurrency)
+        self.in_flight = 0
+        self.rate_limited_count = 0
+        self.transient_error_count = 0
+
+        self._waiters: list[tuple[int, int, int, asyncio.Future]] = []
+        self._counter = itertools.count()
+        self._reserved_tokens = 0
+        self._remaining_tokens: Optional[int] = None
+        self._tokens_reset_at = 0.0
+        self._blocked_until = 0.0
+        self._last_decrease = 0.0
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    async def call(
+        self,
+        fn: Callable[[], Awaitable[Any]],
+        tokens: int,
+        priority: int = BACKGROUND,
+    ) -> Any:
+        """
+        Run `fn` once a slot is free, retrying on 429 with the limiter's backoff
+        and on transient server/network errors with exponential backoff.
+        If the result has `response_metadata["headers"]`, they feed the AIMD controller.
+        """
+        # registered before queueing, so other processes yield while this call waits too
+        ticket = self.beacon.begin() if self.beacon and priority == INTERACTIVE else None
+        try:
+            for attempt in range(1, self.max_attempts + 1):
+                await self.acquire(tokens, priority)
+                try:
+                    result = await fn()
+                except RateLimitError as exc:
+                    self.release(tokens)
+                    self.record_rate_limited(exc.response.headers, attempt)
+                    if attempt == self.max_attempts:
+                        raise
+                    continue
+                except TRANSIENT_ERRORS as exc:
+                    self.release(tokens)
+                    self.transient_error_count += 1
+                    if attempt == self.max_attempts:
+                        raise
+                    delay = self.base_backoff * 2 ** (attempt - 1)
+                    logger.warning("Transient LLM error (%s); retrying in %.1fs", type(exc).__name__, delay)
+                    await asyncio.sleep(delay)
+                    continue
+                except BaseException:
+                    self.release(tokens)
+                    raise
+
+                self.release(tokens)
+                metadata = getattr(result, "response_metadata", None) or {}
+                self.record_success(metadata.get("headers") or {})
+                return result
+        finally:
+            if self.beacon:
+                self.beacon.end(ticket)
+
+    async def acquire(self, tokens: int, priority: int = BACKGROUND) -> None:
+        """Wait for a slot; callers must `release` with the same token count."""
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._counter), tokens, future))
+        self._dispatch()
+
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # slot was granted just before cancellation
+                self.release(tokens)
+            raise
+
+    def release(self, tokens: int) -> None:
+        self.in_flight -= 1
+        self._reserved_tokens = max(0, self._reserved_tokens - tokens)
+        self._dispatch()
+
+    def record_success(self, headers: Mapping[str, str]) -> None:
+        """Additive increase, unless the headers show the quota is nearly used up."""
+        if self._update_quota(headers):
+            self._decrease()
+        else:
+            self.limit = min(float(self.max_concurrency), self.limit + 1.0 / self.limit)
+        self._dispatch()
+
+    def record_rate_limited(self, headers: Mapping[str, str], attempt: int = 1) -> None:
+        """Multiplicative decrease and pause all dispatch until the quota resets."""
+        self.rate_limited_count += 1
+        self._update_quota(headers)
+        self._decrease()
+
+        delay = _retry_after(headers) or self.base_backoff * 2 ** (attempt - 1)
+        self._blocked_until = max(self._blocked_until, time.monotonic() + delay)
+        self._dispatch()
+
+    def _decrease(self) -> None:
+        # Several in-flight calls often fail together; count that as one congestion event
+        now = time.monotonic()
+        if now - self._last_decrease < 1.0:
+            return
+        self._last_decrease = now
+        self.limit = max(float(self.min_concurrency), self.limit * self.decrease_factor)
+
+    def _update_quota(self, headers: Mapping[str, str]) -> bool:
+        """Store remaining-token state; return True if either quota is below headroom."""
+        low = False
+        now = time.monotonic()
+
+        for kind in ("requests", "tokens"):
+            limit = _parse_int(headers.get(f"x-ratelimit-limit-{kind}"))
+            remaining = _parse_int(headers.get(f"x-ratelimit-remaining-{kind}"))
+            if remaining is None:
+                continue
+            if limit and remaining < limit * self.headroom:
+                low = True
+            if kind == "tokens":
+                self._remaining_tokens = remaining
+                reset = _parse_duration(headers.get("x-ratelimit-reset-tokens"))
+                self._tokens_reset_at = now + (reset or 0.0)
+
+        return low
+
+    def _dispatch(self) -> None:
+        now = time.monotonic()
+        if self._remaining_tokens is not None and now >= self._tokens_reset_at:
+            # window has rolled over; the next response will report fresh numbers
+            self._remaining_tokens = None
+
+        wake_at = None
+        while self._waiters:
+            priority, _, tokens, future = self._waiters[0]
+            if future.done():
+                heapq.heappop(self._waiters)
+                continue
+            if self.in_flight >= max(1, int(self.limit)):
+                break
+            if (
+                priority == BACKGROUND
+                and self.beacon is not None
+                and self.in_flight >= self.min_concurrency
+                and self.beacon.busy()
+            ):
+                # another process is serving interactive calls; check again shortly
+                wake_at = now + self.beacon.poll_seconds
+                break
+            if now < self._blocked_until:
+                wake_at = self._blocked_until
+                break
+            if (
+                self.in_flight > 0
+                and self._remaining_tokens is not None
+                and self._reserved_tokens + tokens > self._remaining_tokens
+            ):
+                wake_at = self._tokens_reset_at
+                break
+
+            heapq.heappop(self._waiters)
+            self.in_flight += 1
+            self._reserved_tokens += tokens
+            future.set_result(None)
+
+        if wake_at is not None:
+            self._schedule_wakeup(wake_at - now)
+
+    def _schedule_wakeup(self, delay: float) -> None:
+        if self._timer is not None and not self._timer.cancelled():
+            self._timer.cancel()
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        self._timer = loop.call_later(max(0.0, delay), self._dispatch)
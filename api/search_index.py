@@ -0,0 +1,260 @@
+"""
+SQLite FTS5 index over articles and their summaries.
+
+Built by the pipeline next to the JSON files and opened read-only by the API,
+so corpus selection (keywords, journal, date range) and pagination happen in
+SQLite instead of scanning Python lists.
+"""
+import json
+import os
+import sqlite3
+from contextlib import closing
+from pathlib import Path
+from typing import Optional
+
+from .models import (
+    ArticleFilter,
+    FacetCount,
+    Facets,
+    IndexedArticle,
+    PipelineConfig,
+    PubMedArticle,
+    SearchHit,
+    SearchPage,
+    SummaryResult,
+)
+from .tracing import traced
+from .utils import parse_pub_date
+
+DATA_DIR = Path(os.getenv("DATA_DIR", "data"))
+
+_SCHEMA = """
+CREATE TABLE articles (
+    pmid TEXT PRIMARY KEY,
+    title TEXT NOT NULL,
+    abstract TEXT NOT NULL,
+    journal TEXT,
+    pub_date TEXT,
+    pub_day TEXT,          -- ISO date parsed from pub_date, for range filters
+    month TEXT,            -- YYYY-MM, for facets
+    summary TEXT,
+    hallucination_score INTEGER,
+    questionable_claims TEXT,
+    duplicate_of TEXT
+);
+CREATE INDEX idx_articles_pub_day ON articles (pub_day);
+CREATE INDEX idx_articles_journal ON articles (journal COLLATE NOCASE);
+CREATE VIRTUAL TABLE articles_fts USING fts5(
+    title, abstract, summary, journal,
+    content='articles', content_rowid='rowid'
+);
+"""
+
+
+def index_path(config: PipelineConfig) -> Path:
+    return DATA_DIR / f"pubmed_index_{config.year}.sqlite"
+
+
+@traced()
+def build_index(
+    config: PipelineConfig,
+    articles: list[PubMedArticle],
+    summaries: list[SummaryResult],
+) -> Path:
+    """
+    (Re)build the index for a year. The new index is written to a temporary
+    file and swapped in atomically, so API readers never see a partial index.
+    """
+    path = index_path(config)
+    tmp_path = path.with_suffix(".sqlite.tmp")
+    tmp_path.unlink(missing_ok=True)
+
+    by_pmid = {s.pmid: s for s in summaries}
+    rows = []
+    for article in articles:
+        summary = by_pmid.get(article.pmid)
+        pub_day = parse_pub_date(article.pub_date)
+        rows.append((
+            article.pmid,
+            article.title,
+            article.abstract,
+            article.journal,
+            article.pub_date,
+            pub_day.isoformat() if pub_day else None,
+            pub_day.strftime("%Y-%m") if pub_day else None,
+            summary.summary if summary else None,
+            summary.hallucination_score if summary else None,
+            json.dumps(summary.questionable_claims) if summary else None,
+            summary.duplicate_of if summary else None,
+        ))
+
+    with closing(sqlite3.connect(tmp_path)) as conn:
+        conn.executescript(_SCHEMA)
+        conn.executemany(
+            "INSERT OR REPLACE INTO articles VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows
+        )
+        conn.execute("INSERT INTO articles_fts (articles_fts) VALUES ('rebuild')")
+        conn.commit()
+
+    os.replace(tmp_path, path)
+    return path
+
+
+def _connect(config: PipelineConfig) -> sqlite3.Connection:
+    path = index_path(config)
+    if not path.exists():
+        raise FileNotFoundError(f"File located at: '{path}' does not exist")
+
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def _match_expression(keywords: str) -> str:
+    """Quote each word so user input is matched literally (implicit AND)."""
+    return " ".join('"' + word.replace('"', '""') + '"' for word in keywords.split())
+
+
+def _where(article_filter: Optional[ArticleFilter]) -> tuple[str, list]:
+    clauses: list[str] = []
+    params: list = []
+
+    if article_filter is not None:
+        if article_filter.keywords and article_filter.keywords.strip():
+            clauses.append("articles_fts MATCH ?")
+            params.append(_match_expression(article_filter.keywords))
+        if article_filter.journal:
+            clauses.append("articles.journal = ? COLLATE NOCASE")
+            params.append(article_filter.journal)
+        if article_filter.date_from:
+            clauses.append("articles.pub_day >= ?")
+            params.append(article_filter.date_from.isoformat())
+        if article_filter.date_to:
+            clauses.append("articles.pub_day <= ?")
+            params.append(article_filter.date_to.isoformat())
+
+    return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+
+def _has_keywords(article_filter: Optional[ArticleFilter]) -> bool:
+    return bool(article_filter and article_filter.keywords and article_filter.keywords.strip())
+
+
+# The FTS table is only joined when there is a MATCH, so plain filters use the b-tree indexes
+def _from(article_filter: Optional[ArticleFilter]) -> str:
+    if _has_keywords(article_filter):
+        return " FROM articles_fts JOIN articles ON articles.rowid = articles_fts.rowid"
+    return " FROM articles"
+
+
+def search(
+    config: PipelineConfig,
+    article_filter: Optional[ArticleFilter] = None,
+    page: int = 1,
+    page_size: int = 20,
+) -> SearchPage:
+    """Filtered, paginated search; ranked by relevance with keywords, else newest first."""
+    where, params = _where(article_filter)
+    source = _from(article_filter)
+
+    if _has_keywords(article_filter):
+        snippet = "snippet(articles_fts, -1, '[', ']', '…', 16)"
+        order = "bm25(articles_fts)"
+    else:
+        snippet = "NULL"
+        order = "articles.pub_day IS NULL, articles.pub_day DESC, articles.pmid"
+
+    with closing(_connect(config)) as conn:
+        total = conn.execute(f"SELECT COUNT(*){source}{where}", params).fetchone()[0]
+        rows = conn.execute(
+            f"""
+            SELECT articles.pmid, articles.title, articles.journal, articles.pub_date,
+                   {snippet} AS snippet
+            {source}{where}
+            ORDER BY {order}
+            LIMIT ? OFFSET ?
+            """,
+            [*params, page_size, (page - 1) * page_size],
+        ).fetchall()
+
+    return SearchPage(
+        total=total,
+        page=page,
+        page_size=page_size,
+        results=[SearchHit(**dict(row)) for row in rows],
+    )
+
+
+def get_article(config: PipelineConfig, pmid: str) -> Optional[IndexedArticle]:
+    with closing(_connect(config)) as conn:
+        row = conn.execute(
+            """
+            SELECT pmid, title, abstract, journal, pub_date, summary,
+                   hallucination_score, questionable_claims, duplicate_of
+            FROM articles WHERE pmid = ?
+            """,
+            (pmid,),
+        ).fetchone()
+
+    if row is None:
+        return None
+
+    data = dict(row)
+    data["questionable_claims"] = json.loads(data["questionable_claims"] or "[]")
+    return IndexedArticle(**data)
+
+
+def facets(config: PipelineConfig, article_filter: Optional[ArticleFilter] = None, limit: int = 50) -> Facets:
+    """Article counts per journal and per publication month for the filtered corpus."""
+    where, params = _where(article_filter)
+    source = _from(article_filter)
+
+    def counts(column: str, order: str) -> list[FacetCount]:
+        null_check = f"{'AND' if where else 'WHERE'} {column} IS NOT NULL"
+        with closing(_connect(config)) as conn:
+            rows = conn.execute(
+                f"""
+                SELECT {column} AS value, COUNT(*) AS count
+                {source}{where} {null_check}
+                GROUP BY {column}
+                ORDER BY {order}
+                LIMIT ?
+                """,
+                [*params, limit],
+            ).fetchall()
+        return [FacetCount(**dict(row)) for row in rows]
+
+    return Facets(
+        journals=counts("articles.journal", "count DESC, value"),
+        months=counts("articles.month", "value"),
+    )
+
+
+def filtered_summaries(config: PipelineConfig, article_filter: ArticleFilter) -> list[SummaryResult]:
+    """
+    Summaries of the articles matching the filter, oldest first. A matching
+    near-duplicate stands for its canonical article, so each summary is listed once.
+    """
+    where, params = _where(article_filter)
+
+    with closing(_connect(config)) as conn:
+        rows = conn.execute(
+            f"""
+            SELECT canonical.pmid, canonical.title, canonical.summary, canonical.pub_date,
+                   canonical.hallucination_score, canonical.questionable_claims, canonical.duplicate_of
+            FROM articles AS canonical
+            WHERE canonical.summary IS NOT NULL AND canonical.duplicate_of IS NULL
+              AND canonical.pmid IN (
+                  SELECT COALESCE(articles.duplicate_of, articles.pmid){_from(article_filter)}{where}
+              )
+            ORDER BY canonical.pub_day, canonical.pmid
+            """,
+            params,
+        ).fetchall()
+
+    results = []
+    for row in rows:
+        data = dict(row)
+        data["questionable_claims"] = json.loads(data["questionable_claims"] or "[]")
+        results.append(SummaryResult(**data))
+    return results
@@ -0,0 +1,252 @@
+"""
+Lightweight span tracing for pipeline runs.
+
+Spans are recorded only after `configure()` is called, so the API and tests
+pay nothing for the instrumentation. `export()` writes the spans as OTLP/JSON
+(the OpenTelemetry protocol's JSON encoding), which can be loaded by any
+OTLP-compatible collector or viewer; `report()` renders the critical path and
+a flame-style breakdown for the terminal.
+"""
+import functools
+import inspect
+import json
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Iterator, Optional
+
+from pydantic import BaseModel, Field
+
+
+class Span(BaseModel):
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str] = None
+    start_ns: int
+    end_ns: int = 0
+    attributes: dict[str, Any] = Field(default_factory=dict)
+    error: Optional[str] = None
+
+    @property
+    def duration_ms(self) -> float:
+        return (self.end_ns - self.start_ns) / 1e6
+
+
+class Tracer:
+    def __init__(self):
+        self.enabled = False
+        self.spans: list[Span] = []
+        self.trace_id = ""
+
+    def configure(self) -> None:
+        """Start recording a new trace."""
+        self.enabled = True
+        self.spans = []
+        self.trace_id = os.urandom(16).hex()
+
+
+TRACER = Tracer()
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+def configure() -> None:
+    TRACER.configure()
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Optional[Span]]:
+    """Record a span around the block; child spans (including asyncio tasks) nest under it."""
+    if not TRACER.enabled:
+        yield None
+        return
+
+    parent = _current_span.get()
+    current = Span(
+        name=name,
+        trace_id=TRACER.trace_id,
+        span_id=os.urandom(8).hex(),
+        parent_id=parent.span_id if parent else None,
+        start_ns=time.time_ns(),
+        attributes=attributes,
+    )
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as exc:
+        current.error = f"{type(exc).__name__}: {exc}"
+        raise
+    finally:
+        current.end_ns = time.time_ns()
+        _current_span.reset(token)
+        TRACER.spans.append(current)
+
+
+def record(name: str, start_ns: int, end_ns: int, **attributes: Any) -> Optional[Span]:
+    """
+    Record a span timed elsewhere, e.g. in a worker process whose own TRACER
+    is discarded, as a child of the current span.
+    """
+    if not TRACER.enabled:
+        return None
+
+    parent = _current_span.get()
+    recorded = Span(
+        name=name,
+        trace_id=TRACER.trace_id,
+        span_id=os.urandom(8).hex(),
+        parent_id=parent.span_id if parent else None,
+        start_ns=start_ns,
+        end_ns=end_ns,
+        attributes=attributes,
+    )
+    TRACER.spans.append(recorded)
+    return recorded
+
+
+def traced(name: Optional[str] = None):
+    """Decorator form of `span` for sync and async functions."""
+    def decorator(fn):
+        span_name = name or fn.__name__
+
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with span(span_name):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(span_name):
+                return fn(*args, **kwargs)
+        return wrapper
+
+    return decorator
+
+
+def _otlp_value(value: Any) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def export(path: Path, service_name: str = "inizio-pipeline") -> None:
+    """Write recorded spans to `path` as an OTLP/JSON ExportTraceServiceRequest."""
+    spans = []
+    for s in TRACER.spans:
+        otlp_span = {
+            "traceId": s.trace_id,
+            "spanId": s.span_id,
+            "name": s.name,
+            "kind": 1,  # SPAN_KIND_INTERNAL
+            "startTimeUnixNano": str(s.start_ns),
+            "endTimeUnixNano": str(s.end_ns),
+            "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in s.attributes.items()],
+            "status": {"code": 2, "message": s.error} if s.error else {"code": 1},
+        }
+        if s.parent_id:
+            otlp_span["parentSpanId"] = s.parent_id
+        spans.append(otlp_span)
+
+    payload = {
+        "resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": service_name}}]},
+            "scopeSpans": [{"scope": {"name": __name__}, "spans": spans}],
+        }]
+    }
+
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    with Path(path).open("w", encoding="utf-8") as fhandle:
+        json.dump(payload, fhandle, indent=2)
+
+
+def critical_path(spans: list[Span]) -> list[tuple[int, Span]]:
+    """
+    (depth, span) pairs for the chain that determined the total run time.
+
+    Starting from the longest root, within each span follow the child that
+    finished last, then the child that finished last before that one started,
+    and so on; concurrent siblings that finished earlier are off the path.
+    """
+    children = _children(spans)
+    roots = children.get(None, [])
+    if not roots:
+        return []
+
+    def walk(current: Span, depth: int) -> list[tuple[int, Span]]:
+        chain: list[Span] = []
+        cursor = current.end_ns
+        while True:
+            candidates = [c for c in children.get(current.span_id, []) if c.end_ns <= cursor]
+            if not candidates:
+                break
+            chain.append(max(candidates, key=lambda c: c.end_ns))
+            cursor = chain[-1].start_ns
+
+        path = [(depth, current)]
+        for child in reversed(chain):
+            path.extend(walk(child, depth + 1))
+        return path
+
+    return walk(max(roots, key=lambda s: s.end_ns - s.start_ns), 0)
+
+
+def report(spans: Optional[list[Span]] = None, min_share: float = 0.005) -> str:
+    """Critical path plus a flame-style tree aggregated by span name."""
+    spans = TRACER.spans if spans is None else spans
+    if not spans:
+        return "No spans recorded."
+
+    lines = ["Critical path:"]
+    for depth, s in critical_path(spans):
+        lines.append(f"  {'  ' * depth}{s.name:<{40 - 2 * depth}} {s.duration_ms:>10.1f} ms")
+
+    # aggregate spans by their name path: total (summed) time and call count
+    by_id = {s.span_id: s for s in spans}
+    totals: dict[tuple[str, ...], list[float]] = {}
+    for s in spans:
+        stack = [s.name]
+        parent = by_id.get(s.parent_id)
+        while parent is not None:
+            stack.append(parent.name)
+            parent = by_id.get(parent.parent_id)
+        entry = totals.setdefault(tuple(reversed(stack)), [0.0, 0])
+        entry[0] += s.duration_ms
+        entry[1] += 1
+
+    wall_ms = max(s.end_ns for s in spans) / 1e6 - min(s.start_ns for s in spans) / 1e6
+    lines.append("")
+    lines.append(f"Time by stage (summed over concurrent spans; wall clock {wall_ms:.1f} ms):")
+
+    def emit(prefix: tuple[str, ...]) -> None:
+        stacks = sorted((k for k in totals if k[:-1] == prefix), key=lambda k: -totals[k][0])
+        for stack in stacks:
+            total, count = totals[stack]
+            if wall_ms and total / wall_ms < min_share:
+                continue
+            depth = len(stack) - 1
+            bar = "#" * max(1, round(20 * min(1.0, total / wall_ms))) if wall_ms else ""
+            lines.append(
+                f"  {'  ' * depth}{stack[-1]:<{40 - 2 * depth}} {total:>10.1f} ms  x{count:<5} {bar}"
+            )
+            emit(stack)
+
+    emit(())
+
+    return "\n".join(lines)
+
+
+def _children(spans: list[Span]) -> dict[Optional[str], list[Span]]:
+    ids = {s.span_id for s in spans}
+    children: dict[Optional[str], list[Span]] = {}
+    for s in spans:
+        parent = s.parent_id if s.parent_id in ids else None
+        children.setdefault(parent, []).append(s)
+    return children
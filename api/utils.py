@@ -1,11 +1,48 @@
 import os
+import re
 import json
+from datetime import date
 from pathlib import Path
+from typing import Optional
 
-from .models import PubMedArticle, PipelineConfig, SummaryResult
+from .models import PeriodDigest, PubMedArticle, PipelineConfig, SummaryResult
 
 DATA_DIR = Path(os.getenv("DATA_DIR", "data"))
 
+_MONTHS = {m: i for i, m in enumerate(
+    ["jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec"], start=1
+)}
+_SEASONS = {"winter": 1, "spring": 4, "summer": 7, "fall": 10, "autumn": 10}
+
+
+def parse_pub_date(pub_date: Optional[str]) -> Optional[date]:
+    """
+    Parse PubMed publication dates ('2020 Mar 15', '2020 Mar-Apr', '2020 Spring',
+    '2020', '2020-01-01'). Missing month/day default to the first of the period.
+    """
+    if not pub_date:
+        return None
+
+    match = re.match(r"(\d{4})(?:[-/ ](\w+))?(?:[-/ ](\d{1,2}))?", pub_date.strip())
+    if not match:
+        return None
+
+    year, month_text, day_text = match.groups()
+    month = 1
+    if month_text:
+        key = month_text.lower()
+        if key.isdigit():
+            month = int(key)
+        else:
+            month = _MONTHS.get(key[:3]) or _SEASONS.get(key, 1)
+
+    day = int(day_text) if day_text else 1
+    try:
+        return date(int(year), month, day)
+    except ValueError:
+        return date(int(year), min(max(month, 1), 12), 1)
+
+
 def load_pubmed_articles(config: PipelineConfig):
     """Load pubmed articles from JSON file"""
     file_path = DATA_DIR / f"pubmed_{config.year}.json"
@@ -27,4 +64,16 @@ def load_pubmed_summaries(config: PipelineConfig):
     with file_path.open("r", encoding="utf-8") as f:
         summaries = json.load(f)
 
-    return [SummaryResult(**row) for row in summaries]
\ No newline at end of file
+    return [SummaryResult(**row) for row in summaries]
+
+
+def load_period_digests(config: PipelineConfig):
+    """Load per-month summary digests from JSON file"""
+    file_path = DATA_DIR / f"pubmed_digests_{config.year}.json"
+    if not file_path.exists():
+        raise FileNotFoundError(f"File located at: '{file_path}' does not exist")
+
+    with file_path.open("r", encoding="utf-8") as f:
+        digests = json.load(f)
+
+    return [PeriodDigest(**row) for row in digests]
@@ -0,0 +1,338 @@
+import json
+import random
+import sqlite3
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Optional, Sequence
+
+from .models import WorkUnit
+
+PENDING = "pending"
+CLAIMED = "claimed"
+DONE = "done"
+FAILED = "failed"
+
+
+class WorkQueue:
+    """
+    SQLite-backed queue of PMID work units shared by pipeline workers.
+
+    Claims run inside `BEGIN IMMEDIATE` transactions, so SQLite's file lock
+    serializes them across processes and across hosts sharing the volume.
+    The default rollback journal is used on purpose: WAL mode relies on shared
+    memory and does not work over network filesystems.
+
+    A claimed unit whose lease expires (worker crashed or was killed) becomes
+    claimable again; workers extend their lease with `renew` while they run.
+    A released unit waits `retry_delay * 2**(attempts - 1)` seconds (jittered)
+    before it can be claimed again, and is marked failed after `max_attempts`.
+    A unit completed with some PMIDs still to `retry` commits its result and
+    puts those PMIDs back as a new unit that carries its attempts and backoff;
+    `deferred` PMIDs (left out by the budget) go back as a fresh pending unit.
+
+    Token/cost spend is tracked per unit so a budget caps the whole run rather
+    than each unit: a unit `reserve`s its estimate against what is left, and
+    its actual spend replaces the reservation on `complete`/`release`. No unit
+    is claimed once spend plus running units' reservations reach a budget.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        lease_seconds: float = 900.0,
+        max_attempts: int = 3,
+        retry_delay: float = 30.0,
+    ):
+        self.path = Path(path)
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(self.path, timeout=60.0, isolation_level=None)
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS units (
+                id INTEGER PRIMARY KEY,
+                pmids TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                worker TEXT,
+                claimed_at REAL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                available_at REAL,
+                reserved_tokens INTEGER NOT NULL DEFAULT 0,
+                reserved_cost REAL NOT NULL DEFAULT 0,
+                spent_tokens INTEGER NOT NULL DEFAULT 0,
+                spent_cost REAL NOT NULL DEFAULT 0,
+                result TEXT
+            )
+            """
+        )
+        # queues created by earlier versions lack the newer columns
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(units)")}
+        for column, definition in (
+            ("available_at", "REAL"),
+            ("reserved_tokens", "INTEGER NOT NULL DEFAULT 0"),
+            ("reserved_cost", "REAL NOT NULL DEFAULT 0"),
+            ("spent_tokens", "INTEGER NOT NULL DEFAULT 0"),
+            ("spent_cost", "REAL NOT NULL DEFAULT 0"),
+        ):
+            if column not in columns:
+                self._conn.execute(f"ALTER TABLE units ADD COLUMN {column} {definition}")
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def enqueue(self, pmids: list[str], unit_size: int) -> int:
+        """Split PMIDs into units of `unit_size`. Refuses to overwrite an existing queue."""
+        if unit_size < 1:
+            raise ValueError("unit_size must be at least 1")
+
+        with self._transaction():
+            existing = self._conn.execute("SELECT COUNT(*) FROM units").fetchone()[0]
+            if existing:
+                raise RuntimeError(f"Queue at '{self.path}' already holds {existing} units")
+
+            chunks = [pmids[i:i + unit_size] for i in range(0, len(pmids), unit_size)]
+            self._conn.executemany(
+                "INSERT INTO units (pmids) VALUES (?)",
+                [(json.dumps(chunk),) for chunk in chunks],
+            )
+
+        return len(chunks)
+
+    def claim(
+        self,
+        worker_id: str,
+        token_budget: Optional[int] = None,
+        cost_budget: Optional[float] = None,
+    ) -> Optional[WorkUnit]:
+        """
+        Claim the next pending (or lease-expired) unit, or None if there is no
+        work left or the run's spend and reservations have reached either budget.
+        """
+        now = time.time()
+        with self._transaction():
+            self._conn.execute(
+                "UPDATE units SET status = ? WHERE status = ? AND claimed_at < ? AND attempts >= ?",
+                (FAILED, CLAIMED, now - self.lease_seconds, self.max_attempts),
+            )
+            if self.budget_reached(token_budget, cost_budget):
+                return None
+
+            row = self._conn.execute(
+                """
+                SELECT id, pmids, attempts FROM units
+                WHERE (status = ? AND (available_at IS NULL OR available_at <= ?))
+                   OR (status = ? AND claimed_at < ?)
+                ORDER BY id
+                LIMIT 1
+                """,
+                (PENDING, now, CLAIMED, now - self.lease_seconds),
+            ).fetchone()
+            if row is None:
+                return None
+
+            unit_id, pmids, attempts = row
+            self._conn.execute(
+                """
+                UPDATE units SET status = ?, worker = ?, claimed_at = ?, attempts = ?,
+                    reserved_tokens = 0, reserved_cost = 0
+                WHERE id = ?
+                """,
+                (CLAIMED, worker_id, now, attempts + 1, unit_id),
+            )
+
+        return WorkUnit(id=unit_id, pmids=json.loads(pmids), attempts=attempts + 1)
+
+    def retry_in(self) -> Optional[float]:
+        """Seconds until the next released unit can be claimed, or None if none is waiting."""
+        row = self._conn.execute(
+            "SELECT MIN(available_at) FROM units WHERE status = ? AND available_at IS NOT NULL",
+            (PENDING,),
+        ).fetchone()
+        return None if row[0] is None else max(0.0, row[0] - time.time())
+
+    def renew(self, unit_id: int, worker_id: str) -> bool:
+        """Extend the lease on a claimed unit. Returns False if it was lost to another worker."""
+        with self._transaction():
+            cursor = self._conn.execute(
+                "UPDATE units SET claimed_at = ? WHERE id = ? AND worker = ? AND status = ?",
+                (time.time(), unit_id, worker_id, CLAIMED),
+            )
+        return cursor.rowcount == 1
+
+    def reserve(
+        self,
+        unit_id: int,
+        worker_id: str,
+        tokens: int,
+        cost: float,
+        token_budget: Optional[int] = None,
+        cost_budget: Optional[float] = None,
+    ) -> tuple[Optional[int], Optional[float]]:
+        """
+        Reserve up to (tokens, cost) of the run's budgets for a claimed unit.
+        Returns the granted caps for the unit, None for a budget that is not set.
+        """
+        with self._transaction():
+            spent_tokens, spent_cost = self.spent()
+            reserved_tokens, reserved_cost = self._conn.execute(
+                """
+                SELECT COALESCE(SUM(reserved_tokens), 0), COALESCE(SUM(reserved_cost), 0)
+                FROM units WHERE status = ? AND claimed_at >= ? AND id != ?
+                """,
+                (CLAIMED, time.time() - self.lease_seconds, unit_id),
+            ).fetchone()
+
+            granted_tokens = (
+                None if token_budget is None
+                else max(0, min(tokens, token_budget - spent_tokens - reserved_tokens))
+            )
+            granted_cost = (
+                None if cost_budget is None
+                else max(0.0, min(cost, cost_budget - spent_cost - reserved_cost))
+            )
+            self._conn.execute(
+                """
+                UPDATE units SET reserved_tokens = ?, reserved_cost = ?
+                WHERE id = ? AND worker = ? AND status = ?
+                """,
+                (granted_tokens or 0, granted_cost or 0.0, unit_id, worker_id, CLAIMED),
+            )
+
+        return granted_tokens, granted_cost
+
+    def spent(self) -> tuple[int, float]:
+        """Tokens and cost recorded by completed and released units."""
+        return self._conn.execute(
+            "SELECT COALESCE(SUM(spent_tokens), 0), COALESCE(SUM(spent_cost), 0) FROM units"
+        ).fetchone()
+
+    def committed(self) -> tuple[int, float]:
+        """Spend plus the budget reserved by running units (a lapsed lease holds none)."""
+        running = "status = ? AND claimed_at >= ?"
+        return self._conn.execute(
+            f"""
+            SELECT COALESCE(SUM(spent_tokens + CASE WHEN {running} THEN reserved_tokens ELSE 0 END), 0),
+                   COALESCE(SUM(spent_cost + CASE WHEN {running} THEN reserved_cost ELSE 0 END), 0)
+            FROM units
+            """,
+            (CLAIMED, time.time() - self.lease_seconds) * 2,
+        ).fetchone()
+
+    def budget_reached(self, token_budget: Optional[int] = None, cost_budget: Optional[float] = None) -> bool:
+        """True if spend plus running units' reservations reach either budget."""
+        committed_tokens, committed_cost = self.committed()
+        return (
+            (token_budget is not None and committed_tokens >= token_budget)
+            or (cost_budget is not None and committed_cost >= cost_budget)
+        )
+
+    def complete(
+        self,
+        unit_id: int,
+        worker_id: str,
+        result: dict,
+        spent_tokens: int = 0,
+        spent_cost: float = 0.0,
+        retry: Sequence[str] = (),
+        deferred: Sequence[str] = (),
+    ) -> bool:
+        """
+        Commit a unit's result and spend; `retry` PMIDs (left out of the result
+        after a failure) are queued again as if the unit had been released, and
+        `deferred` PMIDs as a new unit that can be claimed once budget is left.
+        Returns False if the lease was lost to another worker, in which case the
+        result is discarded (the spend is kept).
+        """
+        with self._transaction():
+            row = self._conn.execute(
+                "SELECT attempts FROM units WHERE id = ? AND worker = ? AND status = ?",
+                (unit_id, worker_id, CLAIMED),
+            ).fetchone()
+            self._add_spend(unit_id, worker_id, spent_tokens, spent_cost)
+            if row is None:
+                return False
+
+            self._conn.execute(
+                "UPDATE units SET status = ?, result = ? WHERE id = ?",
+                (DONE, json.dumps(result, ensure_ascii=False), unit_id),
+            )
+            if retry:
+                attempts = row[0]
+                self._conn.execute(
+                    "INSERT INTO units (pmids, status, attempts, available_at) VALUES (?, ?, ?, ?)",
+                    (
+                        json.dumps(list(retry)),
+                        FAILED if attempts >= self.max_attempts else PENDING,
+                        attempts,
+                        time.time() + self._backoff(attempts),
+                    ),
+                )
+            if deferred:
+                self._conn.execute("INSERT INTO units (pmids) VALUES (?)", (json.dumps(list(deferred)),))
+        return True
+
+    def release(self, unit_id: int, worker_id: str, spent_tokens: int = 0, spent_cost: float = 0.0) -> None:
+        """
+        Give a unit back after a failure. It can be claimed again after a backoff,
+        so workers hitting the same upstream error do not burn its attempts at once;
+        it is marked failed after max_attempts.
+        """
+        with self._transaction():
+            self._add_spend(unit_id, worker_id, spent_tokens, spent_cost)
+            row = self._conn.execute(
+                "SELECT attempts FROM units WHERE id = ? AND worker = ? AND status = ?",
+                (unit_id, worker_id, CLAIMED),
+            ).fetchone()
+            if row is None:
+                return
+
+            self._conn.execute(
+                """
+                UPDATE units
+                SET status = CASE WHEN attempts >= ? THEN ? ELSE ? END,
+                    worker = NULL, claimed_at = NULL, available_at = ?
+                WHERE id = ?
+                """,
+                (self.max_attempts, FAILED, PENDING, time.time() + self._backoff(row[0]), unit_id),
+            )
+
+    def counts(self) -> dict[str, int]:
+        rows = self._conn.execute("SELECT status, COUNT(*) FROM units GROUP BY status").fetchall()
+        return {status: count for status, count in rows}
+
+    def results(self) -> list[dict]:
+        """Results of completed units, in enqueue order."""
+        rows = self._conn.execute(
+            "SELECT result FROM units WHERE status = ? ORDER BY id", (DONE,)
+        ).fetchall()
+        return [json.loads(result) for (result,) in rows]
+
+    def _backoff(self, attempts: int) -> float:
+        return self.retry_delay * 2 ** (attempts - 1) * random.uniform(0.5, 1.5)
+
+    def _add_spend(self, unit_id: int, worker_id: str, tokens: int, cost: float) -> None:
+        # spend is kept even if the lease was lost, as the tokens were still used
+        self._conn.execute(
+            """
+            UPDATE units
+            SET spent_tokens = spent_tokens + ?, spent_cost = spent_cost + ?,
+                reserved_tokens = CASE WHEN worker = ? THEN 0 ELSE reserved_tokens END,
+                reserved_cost = CASE WHEN worker = ? THEN 0 ELSE reserved_cost END
+            WHERE id = ?
+            """,
+            (tokens, cost, worker_id, worker_id, unit_id),
+        )
+
+    @contextmanager
+    def _transaction(self):
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        self._conn.execute("COMMIT")
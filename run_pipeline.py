@@ -1,45 +1,498 @@
 """
 Pipeline to fetch articles from PubMed API
+
+Usage:
+    python run_pipeline.py                       # single process
+    python run_pipeline.py --retmax 5000 enqueue # split PMIDs into work units
+    python run_pipeline.py worker --processes 4  # run on one or more hosts
+    python run_pipeline.py merge                 # write the final JSON files and digests
+
+    python run_pipeline.py ingest DIR --processes 8   # load baseline/update XML offline
+    python run_pipeline.py --baseline-dir DIR         # single process, offline articles
+
+    python run_pipeline.py --trace data/trace.json    # any command, with a timing report
 """
 import os
 import json
+import socket
 import asyncio
+import logging
+import argparse
+import functools
+import multiprocessing
+from collections import deque
+from contextlib import contextmanager
 from pathlib import Path
+from typing import Callable
 
-from api.pubmed_client import fetch_pubmed_articles
-from api.models import PipelineConfig, SummaryResult
+from api.pubmed_client import (
+    _pubmed_search_ids,
+    fetch_articles_by_pmids,
+    fetch_pubmed_articles,
+)
+from api.pubmed_baseline import baseline_files, ingest_baseline
+from api.models import PipelineConfig, PubMedArticle, SummarizeOutcome, SummaryResult
 from api.llm_orchestrator import (
+    RATE_LIMITER,
+    TEMPLATE_USAGE,
+    USAGE,
     generate_lay_summary,
     check_hallucinations,
 )
+from api.batch import summarize_articles_batch
+from api.budget import BudgetGuard, BudgetPlan, cost, plan_budget
+from api.utils import load_pubmed_summaries
+from api.dedup import find_near_duplicates
+from api.digests import update_period_digests
+from api.search_index import build_index
+from api.work_queue import WorkQueue
+from api import tracing
+from api.tracing import span
 
 DATA_DIR = Path(os.getenv("DATA_DIR", "data"))
 DATA_DIR.mkdir(parents=True, exist_ok=True)
 
-if __name__ == "__main__":
-    config = PipelineConfig()
-    # 1. Fetch data from PubMed API
-    articles = asyncio.run(fetch_pubmed_articles(config))
+logger = logging.getLogger("run_pipeline")
 
-    if not articles:
-        raise Exception("No articles found for given config")
 
-    # 2 & 3. Summaries + hallucination check (sequential for clarity;
-    # can be parallelised later with asyncio.gather in small batches)
-    summaries: list[SummaryResult] = []
+async def summarize_article(article: PubMedArticle) -> SummaryResult:
+    """Summary + hallucination check for a single article."""
+    with span("summarize_article", pmid=article.pmid, abstract_chars=len(article.abstract)):
+        summary_text = await generate_lay_summary(article)
+        score, questionable_claims = await check_hallucinations(article, summary_text)
+    return SummaryResult(
+        pmid=article.pmid,
+        title=article.title,
+        summary=summary_text,
+        pub_date=article.pub_date,
+        hallucination_score=score,
+        questionable_claims=questionable_claims,
+    )
+
+
+async def summarize_articles(
+    articles: list[PubMedArticle],
+    config: PipelineConfig,
+    previous: dict[str, SummaryResult] | None = None,
+) -> SummarizeOutcome:
+    """
+    Summarize articles concurrently, in `config.order`, within the token/cost budget.
+    Concurrency is bounded by the shared rate limiter in api.llm_orchestrator.
+
+    Articles with a summary in `previous` (from an earlier run) are not
+    summarized again and are left out of the result.
+    Near-duplicate abstracts are not sent to the LLM; they reuse the summary
+    of their canonical article, new or previous, and record it in `duplicate_of`.
+    Articles whose LLM calls failed are listed in `failed`, and articles left
+    out by the budget in `deferred`, each with their near-duplicates, so the
+    caller can retry or resume them.
+    """
+    previous = previous or {}
+    known = [a for a in articles if a.pmid in previous and not previous[a.pmid].duplicate_of]
+    articles = [a for a in articles if a.pmid not in previous]
+
+    with span("dedup", articles=len(articles), known=len(known)):
+        duplicates = find_near_duplicates(articles, config.dedup_threshold, known=known)
+    canonical = [a for a in articles if a.pmid not in duplicates]
+
+    plan = plan_budget(canonical, config)
+    guard = BudgetGuard(config)
+    by_article = {a.pmid: a for a in canonical}
+    pending = deque(plan.selected)
+    results: list[SummaryResult] = []
+    failed: list[str] = []
+
+    async def worker():
+        while pending:
+            estimate = pending.popleft()
+            if not guard.admit(estimate):
+                return
+            try:
+                results.append(await summarize_article(by_article[estimate.pmid]))
+            except Exception:
+                # keep the rest of the run; the caller decides how to retry the article
+                logger.exception("Skipping article %s", estimate.pmid)
+                failed.append(estimate.pmid)
+            finally:
+                guard.settle(estimate)
+
+    with span("summarize", articles=len(plan.selected)):
+        if config.batch:
+            # a submitted batch cannot be stopped part-way, so only the plan's caps apply
+            results = await summarize_articles_batch([by_article[e.pmid] for e in plan.selected], config)
+            done = {r.pmid for r in results}
+            failed = [e.pmid for e in plan.selected if e.pmid not in done]
+        else:
+            workers = min(RATE_LIMITER.max_concurrency, len(plan.selected))
+            await asyncio.gather(*(worker() for _ in range(workers)))
+    by_pmid = {**previous, **{r.pmid: r for r in results}}
+    # canonical articles that were neither summarized nor failed were left out by the budget
+    deferred = {a.pmid for a in canonical if a.pmid not in by_pmid and a.pmid not in failed}
+
+    outcome = SummarizeOutcome()
     for article in articles:
-        summary_text = asyncio.run(generate_lay_summary(article))
-        score, questionable_claims = asyncio.run(check_hallucinations(article, summary_text))
-        summaries.append(
-            SummaryResult(
-                pmid=article.pmid,
-                title=article.title,
-                summary=summary_text,
-                hallucination_score=score,
-                questionable_claims=questionable_claims,
+        canonical_pmid = duplicates.get(article.pmid, article.pmid)
+        if canonical_pmid in failed:
+            outcome.failed.append(article.pmid)
+        elif canonical_pmid in deferred:
+            outcome.deferred.append(article.pmid)
+        elif article.pmid in duplicates:
+            outcome.summaries.append(
+                by_pmid[canonical_pmid].model_copy(
+                    update={
+                        "pmid": article.pmid,
+                        "title": article.title,
+                        "pub_date": article.pub_date,
+                        "duplicate_of": canonical_pmid,
+                    }
+                )
             )
+        else:
+            outcome.summaries.append(by_pmid[article.pmid])
+
+    linked = sum(1 for s in outcome.summaries if s.duplicate_of)
+    if linked:
+        # two calls per article: summary + hallucination check
+        logger.info("Linked %d near-duplicate abstracts; avoided %d LLM calls", linked, 2 * linked)
+    if failed:
+        logger.warning("Skipped %d articles after LLM errors", len(failed))
+    _log_budget(plan, guard, len(outcome.deferred), config.batch)
+
+    return outcome
+
+
+def _log_budget(plan: BudgetPlan, guard: BudgetGuard, deferred: int, batch: bool = False) -> None:
+    """Report estimated vs actual token usage and how much work was deferred."""
+    logger.info(
+        "Estimated %d prompt + %d completion tokens ($%.4f) for %d articles",
+        plan.prompt_tokens,
+        plan.completion_tokens,
+        cost(plan.prompt_tokens, plan.completion_tokens, batch),
+        len(plan.selected),
+    )
+    logger.info(
+        "Actual %d prompt + %d completion tokens ($%.4f)",
+        guard.spent_prompt_tokens,
+        guard.spent_completion_tokens,
+        cost(guard.spent_prompt_tokens, guard.spent_completion_tokens, batch),
+    )
+    if deferred:
+        logger.info("Budget reached: %d articles deferred; rerun to resume", deferred)
+
+
+def _log_prompt_cache() -> None:
+    """Report the share of prompt tokens served from the provider's prompt cache, per template."""
+    for key, usage in sorted(TEMPLATE_USAGE.items()):
+        logger.info(
+            "Prompt %s: %d calls, %d of %d prompt tokens cached (%.0f%%)",
+            key,
+            usage.calls,
+            usage.cached_prompt_tokens,
+            usage.prompt_tokens,
+            usage.cache_hit_rate * 100,
         )
 
-    summaries_file = DATA_DIR / f"pubmed_summaries_{config.year}.json"
-    with summaries_file.open("w", encoding="utf-8") as fhandle:
-        json.dump([a.model_dump() for a in summaries], fhandle, ensure_ascii=False, indent=2)
\ No newline at end of file
+
+def _write_json(file_path: Path, rows: list) -> None:
+    with span("write_json", path=str(file_path)), file_path.open("w", encoding="utf-8") as fhandle:
+        json.dump([r.model_dump() for r in rows], fhandle, ensure_ascii=False, indent=2)
+
+
+def _queue_path(config: PipelineConfig) -> Path:
+    return DATA_DIR / f"pipeline_queue_{config.year}.sqlite"
+
+
+@tracing.traced("pipeline")
+async def run(config: PipelineConfig, baseline_dir: Path | None = None) -> list[SummaryResult]:
+    # 1. Fetch data from PubMed API, or from local baseline files
+    if baseline_dir is not None:
+        articles = ingest_baseline(config, baseline_files(baseline_dir))
+    else:
+        articles = await fetch_pubmed_articles(config)
+
+    if not articles:
+        raise Exception("No articles found for given config")
+
+    # Resume: keep summaries from an earlier (e.g. budget-capped) run
+    previous: dict[str, SummaryResult] = {}
+    if not config.force_refresh:
+        try:
+            previous = {s.pmid: s for s in load_pubmed_summaries(config)}
+        except FileNotFoundError:
+            pass
+
+    # 2 & 3. Summaries + hallucination check; earlier summaries are canonical candidates for dedup
+    outcome = await summarize_articles(articles, config, previous)
+    by_pmid = {**previous, **{s.pmid: s for s in outcome.summaries}}
+    summaries = [
+        by_pmid[a.pmid].model_copy(update={"pub_date": by_pmid[a.pmid].pub_date or a.pub_date})
+        for a in articles if a.pmid in by_pmid
+    ]
+
+    _write_json(DATA_DIR / f"pubmed_summaries_{config.year}.json", summaries)
+
+    # 4. Rebuild the search index over articles and summaries
+    build_index(config, articles, summaries)
+
+    # 5. Refresh the per-month digests used for writing trend articles
+    await update_period_digests(summaries, config)
+
+    _log_prompt_cache()
+
+    return summaries
+
+
+async def enqueue(config: PipelineConfig, unit_size: int) -> int:
+    """Search PubMed once and split the PMIDs into work units."""
+    pmids = await _pubmed_search_ids(config)
+    if not pmids:
+        raise Exception("No articles found for given config")
+
+    queue = WorkQueue(_queue_path(config))
+    try:
+        units = queue.enqueue(pmids, unit_size)
+    finally:
+        queue.close()
+
+    logger.info("Enqueued %d PMIDs as %d units", len(pmids), units)
+    return units
+
+
+async def process_unit(
+    pmids: list[str],
+    config: PipelineConfig,
+    reserve: Callable[[int, float], tuple[int | None, float | None]] | None = None,
+) -> dict:
+    """
+    Fetch and summarize one work unit. Near-duplicates are detected within the unit.
+    With `reserve` (see WorkQueue.reserve), the unit's token/cost caps are the
+    share of the run's budget granted for its estimate, not the full caps.
+
+    Articles whose LLM calls failed, or that the budget left out, are not part
+    of the result; they are returned under "failed" and "deferred" for the queue
+    to put back. If every summarized article failed, the unit fails as a whole.
+    """
+    articles = await fetch_articles_by_pmids(pmids)
+    if reserve is not None and (config.token_budget is not None or config.cost_budget is not None):
+        plan = plan_budget(articles, config.model_copy(update={"token_budget": None, "cost_budget": None}))
+        token_cap, cost_cap = reserve(
+            plan.prompt_tokens + plan.completion_tokens,
+            cost(plan.prompt_tokens, plan.completion_tokens, config.batch),
+        )
+        config = config.model_copy(update={"token_budget": token_cap, "cost_budget": cost_cap})
+
+    outcome = await summarize_articles(articles, config)
+    if outcome.failed and not outcome.summaries:
+        raise RuntimeError(f"All {len(outcome.failed)} articles failed")
+
+    remaining = {*outcome.failed, *outcome.deferred}
+    return {
+        "articles": [a.model_dump() for a in articles if a.pmid not in remaining],
+        "summaries": [s.model_dump() for s in outcome.summaries],
+        "failed": outcome.failed,
+        "deferred": outcome.deferred,
+    }
+
+
+async def _renew_lease(queue: WorkQueue, unit_id: int, worker_id: str) -> None:
+    """Extend the unit's lease every third of its length while it is processed."""
+    while True:
+        await asyncio.sleep(queue.lease_seconds / 3)
+        if not queue.renew(unit_id, worker_id):
+            logger.warning("Worker %s lost the lease on unit %d", worker_id, unit_id)
+            return
+
+
+async def work(config: PipelineConfig) -> int:
+    """Claim and process units until the queue is drained. Returns units completed."""
+    worker_id = f"{socket.gethostname()}:{os.getpid()}"
+    queue = WorkQueue(_queue_path(config))
+    completed = 0
+
+    budgets = {"token_budget": config.token_budget, "cost_budget": config.cost_budget}
+
+    try:
+        while True:
+            unit = queue.claim(worker_id, **budgets)
+            if unit is None:
+                if queue.budget_reached(**budgets):
+                    logger.info("Budget reached: %s spent; rerun to resume", queue.spent())
+                    break
+                # released units wait out their backoff before they can be claimed again
+                delay = queue.retry_in()
+                if delay is None:
+                    break
+                await asyncio.sleep(delay)
+                continue
+
+            # units run one at a time per worker, so the USAGE delta is this unit's spend
+            start_prompt, start_completion = USAGE.prompt_tokens, USAGE.completion_tokens
+
+            def spend() -> tuple[int, float]:
+                prompt = USAGE.prompt_tokens - start_prompt
+                completion = USAGE.completion_tokens - start_completion
+                return prompt + completion, cost(prompt, completion, config.batch)
+
+            heartbeat = asyncio.create_task(_renew_lease(queue, unit.id, worker_id))
+            try:
+                with span("work_unit", unit=unit.id, pmids=len(unit.pmids)):
+                    result = await process_unit(
+                        unit.pmids, config, functools.partial(queue.reserve, unit.id, worker_id, **budgets)
+                    )
+            except Exception:
+                logger.exception("Worker %s failed unit %d (attempt %d)", worker_id, unit.id, unit.attempts)
+                queue.release(unit.id, worker_id, *spend())
+                continue
+            finally:
+                heartbeat.cancel()
+
+            failed, deferred = result.pop("failed"), result.pop("deferred")
+            if failed:
+                logger.warning("Worker %s requeued %d failed articles of unit %d", worker_id, len(failed), unit.id)
+            if queue.complete(unit.id, worker_id, result, *spend(), retry=failed, deferred=deferred):
+                completed += 1
+            else:
+                logger.warning("Worker %s lost the lease on unit %d", worker_id, unit.id)
+
+            if deferred:
+                # the unit was granted less than its estimate, so the budget is used up
+                logger.info("Budget reached: %d articles of unit %d deferred; rerun to resume", len(deferred), unit.id)
+                break
+    finally:
+        queue.close()
+
+    logger.info("Worker %s completed %d units", worker_id, completed)
+    _log_prompt_cache()
+    return completed
+
+
+def _worker_process(config: PipelineConfig, trace_path: Path | None) -> None:
+    logging.basicConfig(level=logging.INFO)
+    with _tracing(trace_path.with_stem(f"{trace_path.stem}-{os.getpid()}") if trace_path else None):
+        asyncio.run(work(config))
+
+
+def run_workers(config: PipelineConfig, processes: int, trace_path: Path | None = None) -> None:
+    """Run `processes` local workers; start this on every host sharing DATA_DIR."""
+    if processes == 1:
+        with _tracing(trace_path):
+            asyncio.run(work(config))
+        return
+
+    # each worker process records its own trace file: <trace>-<pid>.json
+    context = multiprocessing.get_context("spawn")
+    workers = [
+        context.Process(target=_worker_process, args=(config, trace_path)) for _ in range(processes)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+
+async def merge(config: PipelineConfig, allow_partial: bool = False) -> list[SummaryResult]:
+    """
+    Write pubmed_articles_{year}.json and pubmed_summaries_{year}.json from
+    completed units, rebuild the search index and refresh the per-month digests.
+    """
+    queue = WorkQueue(_queue_path(config))
+    try:
+        counts = queue.counts()
+        unfinished = sum(n for status, n in counts.items() if status != "done")
+        if unfinished and not allow_partial:
+            raise Exception(f"Queue has unfinished units: {counts}")
+        results = queue.results()
+    finally:
+        queue.close()
+
+    articles = [PubMedArticle(**row) for result in results for row in result["articles"]]
+    summaries = [SummaryResult(**row) for result in results for row in result["summaries"]]
+
+    _write_json(DATA_DIR / f"pubmed_articles_{config.year}.json", articles)
+    _write_json(DATA_DIR / f"pubmed_summaries_{config.year}.json", summaries)
+    build_index(config, articles, summaries)
+    await update_period_digests(summaries, config)
+
+    logger.info("Merged %d summaries from %d units", len(summaries), len(results))
+    _log_prompt_cache()
+    return summaries
+
+
+@contextmanager
+def _tracing(trace_path: Path | None):
+    """Record spans for the block, then export them and print the timing report."""
+    if trace_path is None:
+        yield
+        return
+
+    tracing.configure()
+    try:
+        yield
+    finally:
+        tracing.export(trace_path)
+        print(tracing.report())
+        print(f"Trace written to {trace_path}")
+
+
+def _parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--year", type=int, default=PipelineConfig().year)
+    parser.add_argument("--retmax", type=int, default=PipelineConfig().retmax)
+    parser.add_argument(
+        "--dedup-threshold",
+        type=float,
+        default=PipelineConfig().dedup_threshold,
+        help="abstract similarity above which articles share a summary (0 < t <= 1)",
+    )
+    parser.add_argument("--token-budget", type=int, help="stop once this many tokens would be spent")
+    parser.add_argument("--cost-budget", type=float, help="stop once this many USD would be spent")
+    parser.add_argument("--order", choices=["relevance", "newest"], default=PipelineConfig().order)
+    parser.add_argument("--batch", action="store_true", help="summarize through the OpenAI Batch API")
+    parser.add_argument("--force-refresh", action="store_true", help="re-summarize articles done by earlier runs")
+    parser.add_argument("--baseline-dir", type=Path, help="read articles from local PubMed XML files")
+    parser.add_argument("--trace", type=Path, help="write OTLP/JSON spans here and print a timing report")
+    commands = parser.add_subparsers(dest="command")
+
+    ingest_parser = commands.add_parser("ingest", help="load PubMed baseline/update XML files")
+    ingest_parser.add_argument("directory", type=Path)
+    ingest_parser.add_argument("--processes", type=int, default=None)
+
+    enqueue_parser = commands.add_parser("enqueue", help="search PubMed and create work units")
+    enqueue_parser.add_argument("--unit-size", type=int, default=50)
+
+    worker_parser = commands.add_parser("worker", help="process work units from the queue")
+    worker_parser.add_argument("--processes", type=int, default=1)
+
+    merge_parser = commands.add_parser("merge", help="write final JSON from completed units")
+    merge_parser.add_argument("--allow-partial", action="store_true")
+
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    args = _parse_args()
+    config = PipelineConfig(
+        year=args.year,
+        retmax=args.retmax,
+        dedup_threshold=args.dedup_threshold,
+        token_budget=args.token_budget,
+        cost_budget=args.cost_budget,
+        order=args.order,
+        force_refresh=args.force_refresh,
+        batch=args.batch,
+    )
+
+    if args.command == "worker":
+        run_workers(config, args.processes, args.trace)
+    else:
+        with _tracing(args.trace):
+            if args.command == "enqueue":
+                asyncio.run(enqueue(config, args.unit_size))
+            elif args.command == "merge":
+                asyncio.run(merge(config, args.allow_partial))
+            elif args.command == "ingest":
+                articles = ingest_baseline(config, baseline_files(args.directory), args.processes)
+                logger.info("Ingested %d articles", len(articles))
+            else:
+                asyncio.run(run(config, args.baseline_dir))
@@ -0,0 +1,168 @@
+"""
+In-memory stand-in for the OpenAI Files and Batches endpoints, served through
+an httpx transport so tests can drive `AsyncOpenAI` without network access.
+"""
+from __future__ import annotations
+
+import itertools
+import json
+import time
+from email.parser import BytesParser
+from email.policy import HTTP
+from typing import Callable, Optional
+
+import httpx
+from openai import AsyncOpenAI
+
+
+class FakeBatchServer:
+    """
+    `respond(body)` receives each request body and returns the assistant
+    message content, or None to make that request fail.
+    A batch finishes after `polls_to_complete` retrieve calls; with a
+    `final_status` other than "completed" it ends without any output.
+    """
+
+    def __init__(
+        self,
+        respond: Callable[[dict], Optional[str]],
+        polls_to_complete: int = 2,
+        final_status: str = "completed",
+    ):
+        self.respond = respond
+        self.polls_to_complete = polls_to_complete
+        self.final_status = final_status
+        self.files: dict[str, bytes] = {}
+        self.batches: dict[str, dict] = {}
+        self.requests: list[dict] = []
+        self._ids = itertools.count(1)
+
+    def client(self) -> AsyncOpenAI:
+        return AsyncOpenAI(
+            api_key="sk-test",
+            base_url="http://batch.test/v1",
+            http_client=httpx.AsyncClient(transport=httpx.MockTransport(self.handle)),
+        )
+
+    def handle(self, request: httpx.Request) -> httpx.Response:
+        parts = request.url.path.strip("/").split("/")[1:]   # drop "v1"
+
+        if request.method == "POST" and parts == ["files"]:
+            return self._create_file(request)
+        if request.method == "GET" and len(parts) == 3 and parts[0] == "files" and parts[2] == "content":
+            return httpx.Response(200, content=self.files[parts[1]])
+        if request.method == "POST" and parts == ["batches"]:
+            return self._create_batch(json.loads(request.content))
+        if request.method == "GET" and len(parts) == 2 and parts[0] == "batches":
+            return self._retrieve_batch(parts[1])
+
+        return httpx.Response(404, json={"error": {"message": f"unknown route {request.url.path}"}})
+
+    def _new_id(self, prefix: str) -> str:
+        return f"{prefix}-{next(self._ids)}"
+
+    def _store_file(self, content: bytes, filename: str, purpose: str) -> dict:
+        file_id = self._new_id("file")
+        self.files[file_id] = content
+        return {
+            "id": file_id,
+            "object": "file",
+            "bytes": len(content),
+            "created_at": int(time.time()),
+            "filename": filename,
+            "purpose": purpose,
+            "status": "processed",
+        }
+
+    def _create_file(self, request: httpx.Request) -> httpx.Response:
+        message = BytesParser(policy=HTTP).parsebytes(
+            f"Content-Type: {request.headers['content-type']}\r\n\r\n".encode() + request.content
+        )
+        fields = {
+            part.get_param("name", header="content-disposition"): part
+            for part in message.iter_parts()
+        }
+        upload = fields["file"]
+        purpose = fields["purpose"].get_payload(decode=True).decode()
+        return httpx.Response(
+            200, json=self._store_file(upload.get_payload(decode=True), upload.get_filename(), purpose)
+        )
+
+    def _create_batch(self, params: dict) -> httpx.Response:
+        batch = {
+            "id": self._new_id("batch"),
+            "object": "batch",
+            "endpoint": params["endpoint"],
+            "input_file_id": params["input_file_id"],
+            "completion_window": params["completion_window"],
+            "status": "validating",
+            "created_at": int(time.time()),
+            "metadata": params.get("metadata"),
+            "_polls": 0,
+        }
+        self.batches[batch["id"]] = batch
+        return httpx.Response(200, json=self._public(batch))
+
+    def _retrieve_batch(self, batch_id: str) -> httpx.Response:
+        batch = self.batches[batch_id]
+        batch["_polls"] += 1
+        if batch["status"] in ("validating", "in_progress"):
+            if batch["_polls"] < self.polls_to_complete:
+                batch["status"] = "in_progress"
+            elif self.final_status == "completed":
+                self._run(batch)
+            else:
+                batch["status"] = self.final_status
+        return httpx.Response(200, json=self._public(batch))
+
+    def _run(self, batch: dict) -> None:
+        output, errors = [], []
+        for line in self.files[batch["input_file_id"]].decode().splitlines():
+            request = json.loads(line)
+            self.requests.append(request)
+            content = self.respond(request["body"])
+            if content is None:
+                errors.append({
+                    "id": self._new_id("req"),
+                    "custom_id": request["custom_id"],
+                    "response": None,
+                    "error": {"code": "server_error", "message": "stand-in failure"},
+                })
+                continue
+            output.append({
+                "id": self._new_id("req"),
+                "custom_id": request["custom_id"],
+                "response": {
+                    "status_code": 200,
+                    "request_id": self._new_id("request"),
+                    "body": {
+                        "id": self._new_id("chatcmpl"),
+                        "object": "chat.completion",
+                        "model": request["body"]["model"],
+                        "choices": [{
+                            "index": 0,
+                            "message": {"role": "assistant", "content": content},
+                            "finish_reason": "stop",
+                        }],
+                        "usage": {"prompt_tokens": 100, "completion_tokens": 50, "total_tokens": 150},
+                    },
+                },
+                "error": None,
+            })
+
+        def jsonl(rows: list[dict]) -> bytes:
+            return "".join(json.dumps(row) + "\n" for row in rows).encode()
+
+        batch["status"] = "completed"
+        batch["output_file_id"] = self._store_file(jsonl(output), "output.jsonl", "batch_output")["id"]
+        if errors:
+            batch["error_file_id"] = self._store_file(jsonl(errors), "errors.jsonl", "batch_output")["id"]
+        batch["request_counts"] = {
+            "total": len(output) + len(errors),
+            "completed": len(output),
+            "failed": len(errors),
+        }
+
+    @staticmethod
+    def _public(batch: dict) -> dict:
+        return {k: v for k, v in batch.items() if not k.startswith("_")}
@@ -0,0 +1,114 @@
+import json
+import os
+import tempfile
+from pathlib import Path
+from unittest import IsolatedAsyncioTestCase
+from unittest.mock import patch
+
+from api import batch
+from api.models import PipelineConfig, PubMedArticle
+
+from tests.fake_openai_batch import FakeBatchServer
+
+
+def _respond(body: dict) -> str | None:
+    prompt = "\n".join(m["content"] for m in body["messages"])
+    if "checking a summary for factual accuracy" in prompt:
+        return json.dumps({"hallucination_score": 1, "questionable_claims": ["Overstated effect"]})
+    if "PMID: 2" in prompt:
+        return None   # this article's summary request fails
+    return "A plain-English summary."
+
+
+def _respond_check_fails(body: dict) -> str | None:
+    prompt = "\n".join(m["content"] for m in body["messages"])
+    if "checking a summary for factual accuracy" in prompt and "Abstract 3." in prompt:
+        return None   # article 3's hallucination check fails
+    return _respond(body)
+
+
+class TestBatch(IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        os.environ.setdefault("OPENAI_API_KEY", "sk-test-dummy")
+
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        data_dir_patcher = patch.object(batch, "DATA_DIR", Path(self.tmp_dir.name))
+        data_dir_patcher.start()
+        self.addCleanup(data_dir_patcher.stop)
+
+        self.server = FakeBatchServer(_respond)
+        self.articles = [
+            PubMedArticle(pmid=pmid, title=f"Study {pmid}", abstract=f"Abstract {pmid}.")
+            for pmid in ("1", "2", "3")
+        ]
+
+    async def test_writes_one_request_per_article(self):
+        await batch.summarize_articles_batch(
+            self.articles, PipelineConfig(), client=self.server.client(), poll_seconds=0
+        )
+
+        [path] = (Path(self.tmp_dir.name) / "batches").glob("pubmed_batch_2020_summaries_*.jsonl")
+        lines = [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+        self.assertEqual([line["custom_id"] for line in lines], ["1:summary", "2:summary", "3:summary"])
+        self.assertEqual(lines[0]["url"], "/v1/chat/completions")
+        messages = lines[0]["body"]["messages"]
+        self.assertEqual([m["role"] for m in messages], ["system", "user"])
+        # the instructions are a byte-identical prefix shared by every request
+        self.assertEqual(messages[0], lines[1]["body"]["messages"][0])
+        self.assertIn("Abstract 1.", messages[-1]["content"])
+
+    async def test_maps_results_back_by_custom_id(self):
+        results = await batch.summarize_articles_batch(
+            self.articles, PipelineConfig(), client=self.server.client(), poll_seconds=0
+        )
+
+        # the failed summary is left out so a rerun picks it up
+        self.assertEqual([r.pmid for r in results], ["1", "3"])
+        self.assertEqual(results[0].summary, "A plain-English summary.")
+        self.assertEqual(results[0].hallucination_score, 1)
+        self.assertEqual(results[0].questionable_claims, ["Overstated effect"])
+
+        # the hallucination batch only covers articles that were summarized
+        check_ids = [r["custom_id"] for r in self.server.requests if r["custom_id"].endswith(":hallucinations")]
+        self.assertEqual(check_ids, ["1:hallucinations", "3:hallucinations"])
+
+    async def test_failed_batch_without_output_raises(self):
+        server = FakeBatchServer(_respond, final_status="failed")
+        path = batch.write_requests(Path(self.tmp_dir.name) / "in.jsonl", [])
+
+        with self.assertRaises(RuntimeError):
+            await batch.run_batch(server.client(), path, "lay_summary@v1", poll_seconds=0)
+
+    async def test_failed_hallucination_check_leaves_article_out(self):
+        server = FakeBatchServer(_respond_check_fails)
+        results = await batch.summarize_articles_batch(
+            self.articles, PipelineConfig(), client=server.client(), poll_seconds=0
+        )
+
+        # neither the failed summary (2) nor the unchecked summary (3) is kept
+        self.assertEqual([r.pmid for r in results], ["1"])
+
+    async def test_units_get_separate_request_files(self):
+        await batch.summarize_articles_batch(
+            self.articles[:1], PipelineConfig(), client=self.server.client(), poll_seconds=0
+        )
+        await batch.summarize_articles_batch(
+            self.articles[2:], PipelineConfig(), client=self.server.client(), poll_seconds=0
+        )
+
+        paths = list((Path(self.tmp_dir.name) / "batches").glob("pubmed_batch_2020_summaries_*.jsonl"))
+        self.assertEqual(len(paths), 2)
+
+    async def test_restart_resumes_the_saved_batch(self):
+        first = await batch.summarize_articles_batch(
+            self.articles, PipelineConfig(), client=self.server.client(), poll_seconds=0
+        )
+        submitted = len(self.server.batches)
+
+        second = await batch.summarize_articles_batch(
+            self.articles, PipelineConfig(), client=self.server.client(), poll_seconds=0
+        )
+
+        self.assertEqual(len(self.server.batches), submitted)
+        self.assertEqual(second, first)
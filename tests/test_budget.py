@@ -0,0 +1,79 @@
+from unittest import TestCase
+from unittest.mock import patch
+
+from api import budget
+from api.models import PipelineConfig, PubMedArticle, TokenUsage
+
+
+def _article(pmid: str, pub_date: str | None, words: int = 100) -> PubMedArticle:
+    return PubMedArticle(pmid=pmid, title=f"Title {pmid}", abstract="word " * words, pub_date=pub_date)
+
+
+class TestBudget(TestCase):
+    def setUp(self):
+        self.articles = [
+            _article("1", "2020 Jan 5"),
+            _article("2", "2020 Jun"),
+            _article("3", None),
+            _article("4", "2020 Mar 1"),
+        ]
+
+    def test_estimate_grows_with_abstract_length(self):
+        short = budget.estimate_article(_article("1", None, words=50))
+        long = budget.estimate_article(_article("1", None, words=500))
+
+        # the abstract appears in both prompts
+        self.assertGreater(long.prompt_tokens - short.prompt_tokens, 2 * 450 * 5 // 4 - 10)
+        self.assertEqual(short.completion_tokens, long.completion_tokens)
+
+    def test_order_newest_puts_undated_last(self):
+        ordered = budget.order_articles(self.articles, "newest")
+
+        self.assertEqual([a.pmid for a in ordered], ["2", "4", "1", "3"])
+        self.assertEqual([a.pmid for a in budget.order_articles(self.articles, "relevance")], ["1", "2", "3", "4"])
+
+    def test_plan_without_caps_selects_everything(self):
+        plan = budget.plan_budget(self.articles, PipelineConfig())
+
+        self.assertEqual([e.pmid for e in plan.selected], ["1", "2", "3", "4"])
+        self.assertEqual(plan.deferred, [])
+
+    def test_plan_stops_at_token_budget(self):
+        per_article = budget.estimate_article(self.articles[0]).total_tokens
+        config = PipelineConfig(token_budget=2 * per_article + 1, order="newest")
+
+        plan = budget.plan_budget(self.articles, config)
+
+        self.assertEqual([e.pmid for e in plan.selected], ["2", "4"])
+        self.assertEqual(plan.deferred, ["1", "3"])
+
+    def test_plan_stops_at_cost_budget(self):
+        config = PipelineConfig(cost_budget=0.0)
+
+        plan = budget.plan_budget(self.articles, config)
+
+        self.assertEqual(plan.selected, [])
+        self.assertEqual(len(plan.deferred), 4)
+
+    def test_batch_requests_are_priced_at_the_batch_discount(self):
+        self.assertAlmostEqual(budget.cost(1000, 1000, batch=True), budget.cost(1000, 1000) * budget.BATCH_COST_FACTOR)
+
+        per_article = budget.estimate_article(self.articles[0]).cost
+        config = PipelineConfig(cost_budget=2 * per_article * budget.BATCH_COST_FACTOR + 1e-9, batch=True)
+        self.assertEqual(len(budget.plan_budget(self.articles, config).selected), 2)
+
+    def test_guard_uses_actual_usage(self):
+        usage = TokenUsage()
+        estimate = budget.ArticleEstimate(pmid="1", prompt_tokens=100, completion_tokens=100)
+
+        with patch.object(budget, "USAGE", usage):
+            guard = budget.BudgetGuard(PipelineConfig(token_budget=500))
+
+            self.assertTrue(guard.admit(estimate))
+            # the call used far more than estimated
+            usage.record({"input_tokens": 300, "output_tokens": 100})
+            guard.settle(estimate)
+
+            self.assertEqual(guard.spent_prompt_tokens, 300)
+            self.assertFalse(guard.admit(estimate))
+            self.assertTrue(guard.stopped)
@@ -0,0 +1,63 @@
+from unittest import TestCase
+
+from api.dedup import MinHashLSH, _lsh_params, find_near_duplicates
+from api.models import PubMedArticle
+
+ABSTRACT = (
+    "We conducted a retrospective cohort study of 1,024 adults hospitalised with Covid-19 "
+    "in three hospitals in Wuhan between January and February 2020. Older age, diabetes and "
+    "elevated D-dimer on admission were associated with in-hospital death. Lymphopenia was "
+    "common and persisted in non-survivors. These findings may help clinicians identify "
+    "patients with poor prognosis at an early stage."
+)
+
+
+def _article(pmid: str, abstract: str) -> PubMedArticle:
+    return PubMedArticle(pmid=pmid, title=f"Title {pmid}", abstract=abstract)
+
+
+class TestDedup(TestCase):
+    def test_lsh_params_cover_all_permutations(self):
+        bands, rows = _lsh_params(0.9, 128)
+
+        self.assertEqual(bands * rows, 128)
+        self.assertLessEqual((1 / bands) ** (1 / rows), 0.9)
+
+    def test_identical_signatures_are_candidates(self):
+        index = MinHashLSH(threshold=0.8, num_perm=64)
+        signature = index.signature({1, 2, 3, 4})
+        index.insert("a", signature)
+
+        self.assertEqual(index.query(signature), ["a"])
+
+    def test_links_republication_to_first_article(self):
+        articles = [
+            _article("1", ABSTRACT),
+            _article("2", "Unrelated work on vaccine hesitancy among healthcare workers in Italy."),
+            _article("3", ABSTRACT.replace("1,024", "1024") + " Erratum in: Lancet."),
+        ]
+
+        duplicates = find_near_duplicates(articles, threshold=0.8)
+
+        self.assertEqual(duplicates, {"3": "1"})
+
+    def test_distinct_abstracts_are_kept(self):
+        articles = [
+            _article("1", ABSTRACT),
+            _article("2", ABSTRACT.replace("Wuhan", "Milan").replace("diabetes", "obesity")
+                     .replace("D-dimer", "troponin").replace("Lymphopenia", "Fever")),
+        ]
+
+        self.assertEqual(find_near_duplicates(articles, threshold=0.95), {})
+
+    def test_threshold_none_disables(self):
+        articles = [_article("1", ABSTRACT), _article("2", ABSTRACT)]
+
+        self.assertEqual(find_near_duplicates(articles, threshold=None), {})
+        self.assertEqual(find_near_duplicates(articles, threshold=0.9), {"2": "1"})
+
+    def test_known_articles_are_canonical_candidates(self):
+        known = [_article("1", ABSTRACT)]
+        articles = [_article("2", ABSTRACT + " Erratum in: Lancet."), _article("3", "Unrelated vaccine study.")]
+
+        self.assertEqual(find_near_duplicates(articles, threshold=0.8, known=known), {"2": "1"})
@@ -0,0 +1,121 @@
+import json
+import shutil
+from pathlib import Path
+from unittest import IsolatedAsyncioTestCase
+from unittest.mock import AsyncMock, patch
+
+from api import digests, utils
+from api.models import PipelineConfig, SummaryResult
+
+
+def _summary(pmid: str, pub_date: str | None, text: str | None = None, **kwargs) -> SummaryResult:
+    return SummaryResult(pmid=pmid, title=f"Study {pmid}", summary=text or f"Summary {pmid}", pub_date=pub_date, **kwargs)
+
+
+class TestDigests(IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.tmp_dir = Path("tmp_test_digests")
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+        self.tmp_dir.mkdir(parents=True)
+        self.addCleanup(shutil.rmtree, self.tmp_dir, True)
+
+        for module in (digests, utils):
+            patcher = patch.object(module, "DATA_DIR", self.tmp_dir)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        generate_patcher = patch("api.digests.generate_period_digest", new_callable=AsyncMock)
+        self.mock_generate = generate_patcher.start()
+        self.addCleanup(generate_patcher.stop)
+        self.mock_generate.side_effect = lambda period, members: f"{period}: {len(members)} studies"
+
+        merge_patcher = patch("api.digests.merge_period_digests", new_callable=AsyncMock)
+        self.mock_merge = merge_patcher.start()
+        self.addCleanup(merge_patcher.stop)
+        self.mock_merge.side_effect = lambda period, parts: " + ".join(parts)
+
+        self.config = PipelineConfig()
+
+    def test_period_key(self):
+        self.assertEqual(digests.period_key("2020 Mar 15"), "2020-03")
+        self.assertEqual(digests.period_key("2020"), "2020-01")
+        self.assertEqual(digests.period_key(None), digests.UNDATED)
+
+    def test_members_hash_ignores_order(self):
+        a, b = _summary("1", None), _summary("2", None)
+
+        self.assertEqual(digests.members_hash([a, b]), digests.members_hash([b, a]))
+        self.assertNotEqual(digests.members_hash([a]), digests.members_hash([a, b]))
+
+    async def test_builds_one_digest_per_month(self):
+        summaries = [
+            _summary("1", "2020 Mar 1"),
+            _summary("2", "2020 Mar 20"),
+            _summary("3", "2020 Apr"),
+            _summary("4", "2020 Apr", duplicate_of="3"),
+            _summary("5", None),
+        ]
+
+        result = await digests.update_period_digests(summaries, self.config)
+
+        self.assertEqual([d.period for d in result], ["2020-03", "2020-04", "undated"])
+        self.assertEqual(result[0].pmids, ["1", "2"])
+        self.assertEqual(result[1].pmids, ["3"])   # duplicates are left out
+        self.assertTrue(digests.digests_cover(result, summaries))
+
+        stored = json.loads((self.tmp_dir / "pubmed_digests_2020.json").read_text(encoding="utf-8"))
+        self.assertEqual(stored[0]["digest"], "2020-03: 2 studies")
+
+    async def test_only_changed_months_are_regenerated(self):
+        summaries = [_summary("1", "2020 Mar 1"), _summary("2", "2020 Apr 2")]
+        await digests.update_period_digests(summaries, self.config)
+        self.mock_generate.reset_mock()
+
+        # one new April paper; March is unchanged
+        summaries.append(_summary("3", "2020 Apr 9"))
+        result = await digests.update_period_digests(summaries, self.config)
+
+        self.assertEqual([call.args[0] for call in self.mock_generate.await_args_list], ["2020-04"])
+        self.assertEqual(result[0].digest, "2020-03: 1 studies")
+        self.assertEqual(result[1].digest, "2020-04: 2 studies")
+
+    async def test_months_without_members_are_dropped(self):
+        await digests.update_period_digests(
+            [_summary("1", "2020 Mar 1"), _summary("2", "2020 Apr 2")], self.config
+        )
+
+        result = await digests.update_period_digests([_summary("1", "2020 Mar 1")], self.config)
+
+        self.assertEqual([d.period for d in result], ["2020-03"])
+
+    async def test_large_month_is_digested_in_bounded_chunks(self):
+        summaries = [_summary(str(pmid), "2020 Mar 1") for pmid in range(1, 6)]
+
+        with patch.object(digests, "CHUNK_SIZE", 2):
+            result = await digests.update_period_digests(summaries, self.config)
+
+        # 5 summaries -> 3 chunks -> 2 merged parts -> 1 digest, no call over more than 2 inputs
+        self.assertEqual(
+            [len(call.args[1]) for call in self.mock_generate.await_args_list], [2, 2, 1]
+        )
+        self.assertTrue(all(len(call.args[1]) <= 2 for call in self.mock_merge.await_args_list))
+        self.assertEqual(self.mock_merge.await_count, 3)
+        self.assertEqual(
+            result[0].digest,
+            "2020-03: 2 studies + 2020-03: 2 studies + 2020-03: 1 studies",
+        )
+
+    async def test_only_changed_chunks_are_regenerated(self):
+        summaries = [_summary(str(pmid), "2020 Mar 1") for pmid in range(1, 6)]
+        with patch.object(digests, "CHUNK_SIZE", 2):
+            await digests.update_period_digests(summaries, self.config)
+            self.mock_generate.reset_mock()
+            self.mock_merge.reset_mock()
+
+            summaries.append(_summary("6", "2020 Mar 9"))
+            result = await digests.update_period_digests(summaries, self.config)
+
+        # only the last chunk changed: its digest, its merged part and the month are redone
+        self.assertEqual([call.args[1] for call in self.mock_generate.await_args_list], [summaries[4:]])
+        self.assertEqual(self.mock_merge.await_count, 2)
+        self.assertEqual(result[0].pmids, ["1", "2", "3", "4", "5", "6"])
@@ -1,9 +1,12 @@
 import os
+import tempfile
+from pathlib import Path
 from unittest import IsolatedAsyncioTestCase
 from unittest.mock import patch, AsyncMock
 
-from api.models import PubMedArticle, SummaryResult
+from api.models import PeriodDigest, PubMedArticle, SummaryResult
 from api import llm_orchestrator
+from api.rate_limiter import InteractiveBeacon
 
 
 class TestLLMOrchestrator(IsolatedAsyncioTestCase):
@@ -11,6 +14,14 @@ class TestLLMOrchestrator(IsolatedAsyncioTestCase):
         # Ensure we don't hit real OpenAI
         os.environ.setdefault("OPENAI_API_KEY", "sk-test-dummy")
 
+        # keep the cross-process beacon out of the real data directory
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        beacon = InteractiveBeacon(Path(tmp_dir.name) / "llm_interactive.sqlite")
+        patcher = patch.object(llm_orchestrator.RATE_LIMITER, "beacon", beacon)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
     @patch("api.llm_orchestrator.LLM")
     async def test_generate_lay_summary(self, mock_llm):
         article = PubMedArticle(
@@ -128,4 +139,63 @@ class TestLLMOrchestrator(IsolatedAsyncioTestCase):
         self.assertEqual(
             unsupported,
             ["This claim is unsupported.", "This one too."],
-        )
\ No newline at end of file
+        )
+
+    @patch("api.llm_orchestrator.LLM")
+    async def test_generate_trend_article_skips_duplicates(self, mock_llm):
+        summaries = [
+            SummaryResult(pmid="1", title="Study 1", summary="Canonical summary"),
+            SummaryResult(pmid="2", title="Study 1 (republished)", summary="Canonical summary", duplicate_of="1"),
+        ]
+
+        mock_llm.ainvoke = AsyncMock()
+        mock_llm.ainvoke.return_value = type("R", (), {"content": "Fake trends article."})
+
+        await llm_orchestrator.generate_trend_article("trendy article", summaries)
+
+        prompt = "\n".join(m.content for m in mock_llm.ainvoke.call_args[0][0])
+        self.assertEqual(prompt.count("Canonical summary"), 1)
+
+    @patch("api.llm_orchestrator.LLM")
+    async def test_generate_trend_article_prefers_digests(self, mock_llm):
+        summaries = [SummaryResult(pmid="1", title="Study 1", summary="Raw summary 1")]
+        digests = [PeriodDigest(period="2020-03", members_hash="h", pmids=["1"], digest="March digest")]
+
+        mock_llm.ainvoke = AsyncMock()
+        mock_llm.ainvoke.return_value = type("R", (), {"content": "Fake trends article."})
+
+        await llm_orchestrator.generate_trend_article("trendy article", summaries, digests=digests)
+
+        prompt = "\n".join(m.content for m in mock_llm.ainvoke.call_args[0][0])
+        self.assertIn("[2020-03, 1 studies]", prompt)
+        self.assertIn("March digest", prompt)
+        self.assertNotIn("Raw summary 1", prompt)
+
+    @patch("api.llm_orchestrator.LLM")
+    async def test_usage_is_recorded_per_template(self, mock_llm):
+        summaries = [SummaryResult(pmid="1", title="Study 1", summary="Summary 1")]
+        usage = {"input_tokens": 1200, "output_tokens": 10, "input_token_details": {"cache_read": 1024}}
+
+        mock_llm.ainvoke = AsyncMock()
+        mock_llm.ainvoke.return_value = type("R", (), {"content": "[]", "usage_metadata": usage})
+
+        with patch.dict(llm_orchestrator.TEMPLATE_USAGE, clear=True):
+            await llm_orchestrator.generate_trend_article("trendy article", summaries)
+            await llm_orchestrator.verify_trend_article("Fake trends article.", summaries)
+
+            # both calls open with the same system message and summaries
+            write_messages = mock_llm.ainvoke.call_args_list[0][0][0]
+            verify_messages = mock_llm.ainvoke.call_args_list[1][0][0]
+            self.assertEqual(write_messages[:2], verify_messages[:2])
+            self.assertIn("Fake trends article.", verify_messages[-1].content)
+
+            with llm_orchestrator.track_usage() as request_usage:
+                await llm_orchestrator.verify_trend_article("Fake trends article.", summaries)
+            # only the call made inside the block is tracked for the request
+            self.assertEqual(list(request_usage), ["verify_trend_article@v1"])
+            self.assertEqual(request_usage["verify_trend_article@v1"].calls, 1)
+
+            verify_usage = llm_orchestrator.TEMPLATE_USAGE["verify_trend_article@v1"]
+            self.assertEqual(verify_usage.calls, 2)
+            self.assertEqual(verify_usage.cached_prompt_tokens, 2048)
+            self.assertIn("trend_article@v1", llm_orchestrator.TEMPLATE_USAGE)
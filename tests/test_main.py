@@ -4,7 +4,9 @@ from unittest import IsolatedAsyncioTestCase
 from unittest.mock import patch
 from httpx import AsyncClient, ASGITransport
 
+from api.digests import members_hash
 from api.main import app
+from api.models import ArticleFilter, PeriodDigest, SearchPage, SummaryResult, TokenUsage
 
 
 class MainTestCase(IsolatedAsyncioTestCase):
@@ -23,11 +25,27 @@ class MainTestCase(IsolatedAsyncioTestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.json(), {"status": "ok"})
 
+    async def test_usage_endpoint_reports_cache_hit_rate_per_template(self):
+        usage = TokenUsage(calls=2, prompt_tokens=4000, cached_prompt_tokens=3000, completion_tokens=500)
+
+        with patch.dict("api.main.TEMPLATE_USAGE", {"verify_trend_article@v1": usage}, clear=True):
+            response = await self.client.get("/usage")
+
+        self.assertEqual(response.status_code, 200)
+        template = response.json()["templates"]["verify_trend_article@v1"]
+        self.assertEqual(template["cached_prompt_tokens"], 3000)
+        self.assertEqual(template["cache_hit_rate"], 0.75)
+
     @patch("api.main.verify_trend_article")
     @patch("api.main.generate_trend_article")
+    @patch("api.main.load_period_digests", side_effect=FileNotFoundError)
     @patch("api.main.load_pubmed_summaries")
     async def test_write_article_endpoint(
-        self, mock_load_pubmed_summaries, mock_generate_trend_article, mock_verify_trend_article
+        self,
+        mock_load_pubmed_summaries,
+        mock_load_period_digests,
+        mock_generate_trend_article,
+        mock_verify_trend_article,
     ):
         mock_load_pubmed_summaries.return_value = ["summary1", "summary2"]
         mock_generate_trend_article.return_value = "Generated article body"
@@ -44,5 +62,97 @@ class MainTestCase(IsolatedAsyncioTestCase):
         self.assertEqual(data["unsupported_claims"], ["unsupported claim 1"])
 
         mock_load_pubmed_summaries.assert_called_once()
-        mock_generate_trend_article.assert_called_once_with("COVID-19 Research", ["summary1", "summary2"])
-        mock_verify_trend_article.assert_called_once_with("Generated article body", ["summary1", "summary2"])
\ No newline at end of file
+        mock_generate_trend_article.assert_called_once_with(
+            "COVID-19 Research", ["summary1", "summary2"], digests=None
+        )
+        mock_verify_trend_article.assert_called_once_with(
+            "Generated article body", ["summary1", "summary2"], digests=None
+        )
+
+    @patch("api.main.verify_trend_article")
+    @patch("api.main.generate_trend_article")
+    @patch("api.main.load_period_digests")
+    @patch("api.main.load_pubmed_summaries")
+    async def test_write_article_uses_current_digests(
+        self,
+        mock_load_pubmed_summaries,
+        mock_load_period_digests,
+        mock_generate_trend_article,
+        mock_verify_trend_article,
+    ):
+        summaries = [
+            SummaryResult(pmid="1", title="Study 1", summary="Summary 1", pub_date="2020 Mar 3"),
+            SummaryResult(pmid="2", title="Study 2", summary="Summary 2", pub_date="2020 Apr"),
+        ]
+        march = PeriodDigest(
+            period="2020-03", members_hash=members_hash(summaries[:1]), pmids=["1"], digest="March digest"
+        )
+        april = PeriodDigest(
+            period="2020-04", members_hash=members_hash(summaries[1:]), pmids=["2"], digest="April digest"
+        )
+        mock_load_pubmed_summaries.return_value = summaries
+        mock_generate_trend_article.return_value = "Generated article body"
+        mock_verify_trend_article.return_value = []
+
+        mock_load_period_digests.return_value = [march, april]
+        await self.client.post("/write-article", json={"title": "COVID-19 Research"})
+        self.assertEqual(mock_generate_trend_article.call_args.kwargs["digests"], [march, april])
+
+        # a stale digest (summaries changed since it was built) is not used
+        mock_load_period_digests.return_value = [march.model_copy(update={"members_hash": "old"}), april]
+        await self.client.post("/write-article", json={"title": "COVID-19 Research"})
+        self.assertIsNone(mock_generate_trend_article.call_args.kwargs["digests"])
+
+    @patch("api.main.verify_trend_article")
+    @patch("api.main.generate_trend_article")
+    @patch("api.main.load_pubmed_summaries")
+    @patch("api.main.filtered_summaries")
+    async def test_write_article_with_filter_uses_index(
+        self,
+        mock_filtered_summaries,
+        mock_load_pubmed_summaries,
+        mock_generate_trend_article,
+        mock_verify_trend_article,
+    ):
+        summaries = [SummaryResult(pmid="1", title="Study 1", summary="Summary 1")]
+        mock_filtered_summaries.return_value = summaries
+        mock_generate_trend_article.return_value = "Generated article body"
+        mock_verify_trend_article.return_value = []
+
+        payload = {
+            "title": "Steroids in 2020",
+            "filter": {"keywords": "dexamethasone", "journal": "NEJM", "date_from": "2020-06-01"},
+        }
+        response = await self.client.post("/write-article", json=payload)
+
+        self.assertEqual(response.status_code, 200)
+        mock_load_pubmed_summaries.assert_not_called()
+        article_filter = mock_filtered_summaries.call_args.args[1]
+        self.assertEqual(article_filter.keywords, "dexamethasone")
+        self.assertEqual(str(article_filter.date_from), "2020-06-01")
+        mock_generate_trend_article.assert_called_once_with("Steroids in 2020", summaries, digests=None)
+
+        mock_filtered_summaries.return_value = []
+        response = await self.client.post("/write-article", json=payload)
+        self.assertEqual(response.status_code, 404)
+
+    @patch("api.main.search")
+    async def test_search_endpoint(self, mock_search):
+        mock_search.return_value = SearchPage(total=0, page=2, page_size=10)
+
+        response = await self.client.get(
+            "/articles", params={"q": "masks", "journal": "Lancet", "page": 2, "page_size": 10}
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["page"], 2)
+        _, article_filter = mock_search.call_args.args
+        self.assertEqual(article_filter, ArticleFilter(keywords="masks", journal="Lancet"))
+        self.assertEqual(mock_search.call_args.kwargs, {"page": 2, "page_size": 10})
+
+        self.assertEqual((await self.client.get("/articles", params={"page": 0})).status_code, 422)
+
+    @patch("api.main.get_article", return_value=None)
+    async def test_unknown_article_is_404(self, mock_get_article):
+        response = await self.client.get("/articles/123")
+        self.assertEqual(response.status_code, 404)
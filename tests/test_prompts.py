@@ -0,0 +1,46 @@
+from unittest import TestCase
+
+from langchain_core.messages import HumanMessage, SystemMessage
+
+from api import prompts
+from api.models import TokenUsage
+
+
+class TestPrompts(TestCase):
+    def test_get_template_returns_latest_version(self):
+        template = prompts.PromptTemplate(name="test_template", version=1, instructions="v1", input="{x}")
+        prompts.register(template)
+        newer = prompts.register(template.model_copy(update={"version": 2, "instructions": "v2"}))
+        self.addCleanup(prompts.REGISTRY.pop, "test_template@v1")
+        self.addCleanup(prompts.REGISTRY.pop, "test_template@v2")
+
+        self.assertIs(prompts.get_template("test_template"), newer)
+        self.assertEqual(prompts.get_template("test_template", version=1).instructions, "v1")
+        with self.assertRaises(ValueError):
+            prompts.register(template)
+        with self.assertRaises(KeyError):
+            prompts.get_template("test_template", version=3)
+
+    def test_render_puts_static_text_first_and_per_call_content_last(self):
+        template = prompts.get_template("verify_trend_article")
+        messages = template.render(context="STUDY SUMMARIES:\nS1", article='Braces {kept} "as is"')
+
+        self.assertEqual([type(m) for m in messages], [SystemMessage, HumanMessage, HumanMessage])
+        self.assertEqual(messages[0].content, template.instructions)
+        self.assertEqual(messages[1].content, "STUDY SUMMARIES:\nS1")
+        self.assertTrue(messages[2].content.startswith(template.task))
+        self.assertTrue(messages[2].content.endswith('"""Braces {kept} "as is\""""'))
+
+    def test_trend_templates_share_their_prefix(self):
+        write = prompts.get_template("trend_article").render(context="shared", title="T")
+        verify = prompts.get_template("verify_trend_article").render(context="shared", article="A")
+        self.assertEqual(write[:2], verify[:2])
+
+    def test_usage_records_cached_tokens(self):
+        usage = TokenUsage()
+        usage.record({"input_tokens": 2000, "output_tokens": 100, "input_token_details": {"cache_read": 1536}})
+        usage.record({"input_tokens": 2000, "output_tokens": 100})
+
+        self.assertEqual(usage.cached_prompt_tokens, 1536)
+        self.assertAlmostEqual(usage.cache_hit_rate, 0.384)
+        self.assertEqual(TokenUsage().cache_hit_rate, 0.0)
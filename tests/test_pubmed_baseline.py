@@ -0,0 +1,122 @@
+import gzip
+import json
+import tempfile
+from pathlib import Path
+from unittest import TestCase
+from unittest.mock import patch
+
+from api import pubmed_baseline, tracing
+from api.models import PipelineConfig
+
+
+def _citation(pmid: str, title: str, abstract: str, year: str = "2020", month: str = "Mar") -> str:
+    abstract_xml = f"""
+          <Abstract>
+            <AbstractText Label="BACKGROUND">{abstract}</AbstractText>
+            <AbstractText Label="RESULTS">More <i>results</i>.</AbstractText>
+          </Abstract>""" if abstract else ""
+    return f"""
+    <PubmedArticle>
+      <MedlineCitation>
+        <PMID Version="1">{pmid}</PMID>
+        <Article>
+          <Journal>
+            <JournalIssue><PubDate><Year>{year}</Year><Month>{month}</Month></PubDate></JournalIssue>
+            <Title>Journal {pmid}</Title>
+          </Journal>
+          <ArticleTitle>{title}</ArticleTitle>{abstract_xml}
+        </Article>
+      </MedlineCitation>
+    </PubmedArticle>
+    """
+
+
+def _write_gz(path: Path, body: str) -> Path:
+    with gzip.open(path, "wt", encoding="utf-8") as fhandle:
+        fhandle.write(f"<?xml version='1.0'?><PubmedArticleSet>{body}</PubmedArticleSet>")
+    return path
+
+
+class TestPubMedBaseline(TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        self.root = Path(self.tmp_dir.name)
+
+        data_dir_patcher = patch.object(pubmed_baseline, "DATA_DIR", self.root / "data")
+        data_dir_patcher.start()
+        self.addCleanup(data_dir_patcher.stop)
+
+        self.config = PipelineConfig()
+        self.terms = pubmed_baseline._query_terms(self.config.query)
+
+    def test_query_terms(self):
+        self.assertEqual(
+            pubmed_baseline._query_terms('(covid-19[Title/Abstract] OR "long covid"[ti])'),
+            [("covid-19", ("title", "abstract")), ("long covid", ("title",))],
+        )
+        self.assertEqual(pubmed_baseline._query_terms("influenza"), [("influenza", ("title", "abstract"))])
+
+    def test_unsupported_query_syntax_raises(self):
+        for query in (
+            "covid-19[tiab] NOT review[pt]",
+            "covid-19[tiab] AND vaccine[tiab]",
+            "covid-19[tiab] OR influenza",
+            "review[pt]",
+            "covid-19 AND vaccine",
+        ):
+            with self.subTest(query=query), self.assertRaises(ValueError):
+                pubmed_baseline._query_terms(query)
+
+    def test_parse_filters_by_year_and_terms(self):
+        path = _write_gz(self.root / "pubmed24n0001.xml.gz", "".join([
+            _citation("1", "Covid-19 in adults", "Adults with COVID-19."),
+            _citation("2", "Influenza in adults", "Seasonal flu."),
+            _citation("3", "Covid-19 in 2019?", "Covid-19 early signals.", year="2019"),
+            _citation("4", "Covid-19 without abstract", ""),
+        ]))
+
+        articles, dropped = pubmed_baseline.parse_baseline_file(path, self.terms, 2020)
+
+        self.assertEqual([a["pmid"] for a in articles], ["1"])
+        self.assertEqual(articles[0]["abstract"], "Adults with COVID-19. More results.")
+        self.assertEqual(articles[0]["pub_date"], "2020 Mar")
+        self.assertEqual(articles[0]["journal"], "Journal 1")
+        self.assertEqual(dropped, ["2", "3", "4"])
+
+    def test_ingest_applies_update_files_in_order(self):
+        _write_gz(self.root / "pubmed24n0001.xml.gz", "".join([
+            _citation("1", "Covid-19 cohort", "First version."),
+            _citation("2", "Covid-19 trial", "Trial abstract."),
+            _citation("3", "Covid-19 survey", "Survey abstract."),
+        ]))
+        _write_gz(self.root / "pubmed24n0002.xml.gz", "".join([
+            _citation("1", "Covid-19 cohort", "Revised version."),
+            _citation("3", "Survey of influenza", "No longer about the query."),
+            "<DeleteCitation><PMID Version='1'>2</PMID></DeleteCitation>",
+        ]))
+
+        articles = pubmed_baseline.ingest_baseline(
+            self.config, pubmed_baseline.baseline_files(self.root), processes=2
+        )
+
+        self.assertEqual([(a.pmid, a.abstract) for a in articles], [("1", "Revised version. More results.")])
+
+        store = json.loads((self.root / "data" / "pubmed_articles_2020.json").read_text(encoding="utf-8"))
+        self.assertEqual([row["pmid"] for row in store], ["1"])
+
+    def test_parse_spans_from_worker_processes_are_recorded(self):
+        _write_gz(self.root / "pubmed24n0001.xml.gz", _citation("1", "Covid-19 cohort", "First."))
+        _write_gz(self.root / "pubmed24n0002.xml.gz", _citation("2", "Covid-19 trial", "Second."))
+
+        tracing.configure()
+        self.addCleanup(setattr, tracing.TRACER, "enabled", False)
+        pubmed_baseline.ingest_baseline(self.config, pubmed_baseline.baseline_files(self.root), processes=2)
+
+        ingest = next(s for s in tracing.TRACER.spans if s.name == "ingest_baseline")
+        parses = [s for s in tracing.TRACER.spans if s.name == "baseline.parse_file"]
+        self.assertEqual([Path(s.attributes["path"]).name for s in parses],
+                         ["pubmed24n0001.xml.gz", "pubmed24n0002.xml.gz"])
+        self.assertEqual({s.parent_id for s in parses}, {ingest.span_id})
+        self.assertTrue(all(0 < s.end_ns - s.start_ns for s in parses))
+        self.assertEqual(parses[0].attributes["matched"], 1)
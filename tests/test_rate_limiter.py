@@ -0,0 +1,217 @@
+import asyncio
+import tempfile
+from pathlib import Path
+from unittest import IsolatedAsyncioTestCase, TestCase
+
+import httpx
+from openai import APITimeoutError, InternalServerError, RateLimitError
+
+from api.rate_limiter import (
+    BACKGROUND,
+    INTERACTIVE,
+    AdaptiveRateLimiter,
+    InteractiveBeacon,
+    _parse_duration,
+    _retry_after,
+)
+
+
+def _rate_limit_error(headers: dict) -> RateLimitError:
+    response = httpx.Response(
+        429,
+        headers=headers,
+        request=httpx.Request("POST", "https://api.openai.com/v1/chat/completions"),
+    )
+    return RateLimitError("rate limited", response=response, body=None)
+
+
+def _server_error() -> InternalServerError:
+    response = httpx.Response(
+        502, request=httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+    )
+    return InternalServerError("bad gateway", response=response, body=None)
+
+
+class FakeResponse:
+    def __init__(self, headers: dict | None = None):
+        self.response_metadata = {"headers": headers or {}}
+
+
+class TestHeaderParsing(TestCase):
+    def test_parse_duration(self):
+        self.assertEqual(_parse_duration("1s"), 1.0)
+        self.assertEqual(_parse_duration("6m0s"), 360.0)
+        self.assertAlmostEqual(_parse_duration("250ms"), 0.25)
+        self.assertEqual(_parse_duration("2"), 2.0)
+        self.assertIsNone(_parse_duration(None))
+        self.assertIsNone(_parse_duration("soon"))
+
+    def test_retry_after_prefers_ms_header(self):
+        self.assertAlmostEqual(_retry_after({"retry-after-ms": "150", "retry-after": "3"}), 0.15)
+        self.assertEqual(_retry_after({"retry-after": "3"}), 3.0)
+        self.assertEqual(_retry_after({"x-ratelimit-reset-tokens": "2s"}), 2.0)
+        self.assertIsNone(_retry_after({}))
+
+
+class TestAdaptiveRateLimiter(IsolatedAsyncioTestCase):
+    async def test_additive_increase_on_success(self):
+        limiter = AdaptiveRateLimiter(initial_concurrency=2)
+
+        async def ok():
+            return FakeResponse()
+
+        await limiter.call(ok, tokens=10)
+
+        self.assertAlmostEqual(limiter.limit, 2.5)
+        self.assertEqual(limiter.in_flight, 0)
+
+    async def test_low_remaining_quota_decreases_limit(self):
+        limiter = AdaptiveRateLimiter(initial_concurrency=8)
+
+        async def nearly_exhausted():
+            return FakeResponse({
+                "x-ratelimit-limit-requests": "500",
+                "x-ratelimit-remaining-requests": "10",
+            })
+
+        await limiter.call(nearly_exhausted, tokens=10)
+
+        self.assertEqual(limiter.limit, 4.0)
+
+    async def test_retries_after_429_and_halves_limit(self):
+        limiter = AdaptiveRateLimiter(initial_concurrency=8)
+        attempts = []
+
+        async def flaky():
+            attempts.append(1)
+            if len(attempts) == 1:
+                raise _rate_limit_error({"retry-after-ms": "10"})
+            return FakeResponse()
+
+        result = await limiter.call(flaky, tokens=10)
+
+        self.assertIsInstance(result, FakeResponse)
+        self.assertEqual(len(attempts), 2)
+        self.assertEqual(limiter.rate_limited_count, 1)
+        self.assertLess(limiter.limit, 8.0)
+
+    async def test_gives_up_after_max_attempts(self):
+        limiter = AdaptiveRateLimiter(max_attempts=2)
+
+        async def always_limited():
+            raise _rate_limit_error({"retry-after-ms": "1"})
+
+        with self.assertRaises(RateLimitError):
+            await limiter.call(always_limited, tokens=10)
+        self.assertEqual(limiter.in_flight, 0)
+
+    async def test_retries_transient_errors_without_decrease(self):
+        limiter = AdaptiveRateLimiter(initial_concurrency=8, base_backoff=0.001)
+        errors = [_server_error(), APITimeoutError(request=httpx.Request("POST", "https://api.openai.com"))]
+
+        async def flaky():
+            if errors:
+                raise errors.pop(0)
+            return FakeResponse()
+
+        result = await limiter.call(flaky, tokens=10)
+
+        self.assertIsInstance(result, FakeResponse)
+        self.assertEqual(limiter.transient_error_count, 2)
+        self.assertEqual(limiter.rate_limited_count, 0)
+        self.assertGreater(limiter.limit, 8.0)
+
+        async def always_failing():
+            raise _server_error()
+
+        with self.assertRaises(InternalServerError):
+            await limiter.call(always_failing, tokens=10)
+        self.assertEqual(limiter.in_flight, 0)
+
+    async def test_interactive_calls_jump_the_queue(self):
+        limiter = AdaptiveRateLimiter(initial_concurrency=1, max_concurrency=1)
+        order = []
+        gate = asyncio.Event()
+
+        async def blocker():
+            await gate.wait()
+            return FakeResponse()
+
+        def job(name):
+            async def run():
+                order.append(name)
+                return FakeResponse()
+            return run
+
+        first = asyncio.create_task(limiter.call(blocker, tokens=1))
+        await asyncio.sleep(0)
+        background = asyncio.create_task(limiter.call(job("background"), tokens=1, priority=BACKGROUND))
+        await asyncio.sleep(0)
+        interactive = asyncio.create_task(limiter.call(job("interactive"), tokens=1, priority=INTERACTIVE))
+        await asyncio.sleep(0)
+
+        gate.set()
+        await asyncio.gather(first, background, interactive)
+
+        self.assertEqual(order, ["interactive", "background"])
+
+    async def test_holds_calls_that_exceed_remaining_tokens(self):
+        limiter = AdaptiveRateLimiter(initial_concurrency=4)
+        limiter.record_success({
+            "x-ratelimit-remaining-tokens": "100",
+            "x-ratelimit-reset-tokens": "50ms",
+        })
+
+        await limiter.acquire(80)
+        second = asyncio.create_task(limiter.acquire(80))
+        await asyncio.sleep(0)
+        self.assertFalse(second.done())
+
+        # once the token window resets the waiting call is released
+        await asyncio.wait_for(second, timeout=1)
+        self.assertEqual(limiter.in_flight, 2)
+
+
+class TestInteractiveBeacon(IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        self.path = Path(self.tmp_dir.name) / "llm_interactive.sqlite"
+
+    async def test_background_yields_to_interactive_calls_in_another_limiter(self):
+        # two limiters stand in for the API and pipeline processes
+        api = AdaptiveRateLimiter(beacon=InteractiveBeacon(self.path, poll_seconds=0.01))
+        pipeline = AdaptiveRateLimiter(
+            initial_concurrency=4, beacon=InteractiveBeacon(self.path, poll_seconds=0.01)
+        )
+        gate = asyncio.Event()
+        running = []
+
+        async def interactive_call():
+            await gate.wait()
+            return FakeResponse()
+
+        async def background_call():
+            running.append(1)
+            await asyncio.sleep(0.05)
+            return FakeResponse()
+
+        api_call = asyncio.create_task(api.call(interactive_call, tokens=1, priority=INTERACTIVE))
+        await asyncio.sleep(0.02)
+        background = [asyncio.create_task(pipeline.call(background_call, tokens=1)) for _ in range(4)]
+        await asyncio.sleep(0.02)
+
+        # only min_concurrency background calls run while the API call is in flight
+        self.assertEqual(pipeline.in_flight, 1)
+
+        gate.set()
+        await api_call
+        await asyncio.wait_for(asyncio.gather(*background), timeout=2)
+        self.assertEqual(len(running), 4)
+        self.assertFalse(InteractiveBeacon(self.path, poll_seconds=0).busy())
+
+    def test_expired_rows_do_not_count_as_busy(self):
+        beacon = InteractiveBeacon(self.path, ttl=-1, poll_seconds=0)
+        beacon.begin()
+        self.assertFalse(beacon.busy())
+        self.assertFalse(InteractiveBeacon(Path(self.tmp_dir.name) / "missing.sqlite").busy())
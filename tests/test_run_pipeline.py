@@ -0,0 +1,240 @@
+import json
+import os
+import tempfile
+from pathlib import Path
+from unittest import IsolatedAsyncioTestCase
+from unittest.mock import AsyncMock, patch
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-test-dummy")
+
+import run_pipeline
+from api import utils
+from api.budget import estimate_article
+from api.llm_orchestrator import RATE_LIMITER, USAGE
+from api.models import PipelineConfig, PubMedArticle, SummaryResult
+from api.work_queue import WorkQueue
+
+ABSTRACT = (
+    "We conducted a retrospective cohort study of 1,024 adults hospitalised with Covid-19 "
+    "in three hospitals in Wuhan between January and February 2020. Older age, diabetes and "
+    "elevated D-dimer on admission were associated with in-hospital death."
+)
+
+
+def _article(pmid: str, abstract: str | None = None) -> PubMedArticle:
+    return PubMedArticle(
+        pmid=pmid,
+        title=f"Study {pmid}",
+        abstract=abstract or f"Distinct abstract number {pmid} about a separate cohort of {pmid}0 patients.",
+        pub_date="2020 Mar 1",
+    )
+
+
+async def _fake_summary(article: PubMedArticle) -> str:
+    return f"Summary of {article.pmid}"
+
+
+class TestSummarizeArticles(IsolatedAsyncioTestCase):
+    def setUp(self):
+        for name, mock in (
+            ("generate_lay_summary", AsyncMock(side_effect=_fake_summary)),
+            ("check_hallucinations", AsyncMock(return_value=(0, []))),
+        ):
+            patcher = patch.object(run_pipeline, name, mock)
+            setattr(self, name, patcher.start())
+            self.addCleanup(patcher.stop)
+
+    async def test_failed_article_is_skipped_and_the_rest_kept(self):
+        async def flaky(article):
+            if article.pmid == "2":
+                raise RuntimeError("upstream error")
+            return await _fake_summary(article)
+
+        self.generate_lay_summary.side_effect = flaky
+        articles = [_article(p) for p in ("1", "2", "3")]
+
+        with self.assertLogs("run_pipeline", level="WARNING") as logs:
+            outcome = await run_pipeline.summarize_articles(articles, PipelineConfig())
+
+        self.assertEqual(sorted(s.pmid for s in outcome.summaries), ["1", "3"])
+        self.assertEqual(outcome.failed, ["2"])
+        self.assertTrue(any("Skipping article 2" in line for line in logs.output))
+
+    async def test_duplicates_of_a_failed_article_are_failed_too(self):
+        async def flaky(article):
+            if article.pmid == "1":
+                raise RuntimeError("upstream error")
+            return await _fake_summary(article)
+
+        self.generate_lay_summary.side_effect = flaky
+        articles = [_article("1", ABSTRACT), _article("2"), _article("3", ABSTRACT + " Erratum.")]
+
+        with self.assertLogs("run_pipeline", level="INFO") as logs:
+            outcome = await run_pipeline.summarize_articles(articles, PipelineConfig(dedup_threshold=0.8))
+
+        self.assertEqual([s.pmid for s in outcome.summaries], ["2"])
+        self.assertEqual(outcome.failed, ["1", "3"])
+        self.assertNotIn("near-duplicate", "\n".join(logs.output))
+
+    async def test_near_duplicates_reuse_the_canonical_summary(self):
+        articles = [_article("1", ABSTRACT), _article("2"), _article("3", ABSTRACT + " Erratum.")]
+
+        with self.assertLogs("run_pipeline", level="INFO") as logs:
+            outcome = await run_pipeline.summarize_articles(articles, PipelineConfig(dedup_threshold=0.8))
+
+        by_pmid = {s.pmid: s for s in outcome.summaries}
+        self.assertEqual(by_pmid["3"].duplicate_of, "1")
+        self.assertEqual(by_pmid["3"].summary, "Summary of 1")
+        self.assertEqual(self.generate_lay_summary.await_count, 2)
+        self.assertIn("Linked 1 near-duplicate abstracts; avoided 2 LLM calls", "\n".join(logs.output))
+
+    async def test_new_duplicate_of_previous_summary_is_linked(self):
+        articles = [_article("1", ABSTRACT), _article("2", ABSTRACT + " Erratum.")]
+        previous = {"1": SummaryResult(pmid="1", title="Study 1", summary="Earlier summary")}
+
+        outcome = await run_pipeline.summarize_articles(
+            articles, PipelineConfig(dedup_threshold=0.8), previous
+        )
+        summaries = outcome.summaries
+
+        # the previous article is neither summarized again nor returned
+        self.generate_lay_summary.assert_not_awaited()
+        self.assertEqual(len(summaries), 1)
+        self.assertEqual(summaries[0].pmid, "2")
+        self.assertEqual(summaries[0].duplicate_of, "1")
+        self.assertEqual(summaries[0].summary, "Earlier summary")
+
+    async def test_guard_stops_when_actual_usage_exceeds_the_budget(self):
+        articles = [_article(p) for p in ("1", "2", "3", "4", "5")]
+        budget = sum(estimate_article(a).total_tokens for a in articles)
+
+        async def expensive(article):
+            # far more than estimated: the plan admits all five, the guard stops after one
+            USAGE.record({"input_tokens": budget, "output_tokens": 0})
+            return await _fake_summary(article)
+
+        self.generate_lay_summary.side_effect = expensive
+        with patch.object(RATE_LIMITER, "max_concurrency", 1), \
+                self.assertLogs("run_pipeline", level="INFO") as logs:
+            outcome = await run_pipeline.summarize_articles(articles, PipelineConfig(token_budget=budget))
+
+        self.assertEqual([s.pmid for s in outcome.summaries], ["1"])
+        self.assertIn("Budget reached: 4 articles deferred", "\n".join(logs.output))
+
+
+class TestRun(IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        data_dir = Path(self.tmp_dir.name)
+
+        for target, name, value in (
+            (run_pipeline, "DATA_DIR", data_dir),
+            (utils, "DATA_DIR", data_dir),
+            (run_pipeline, "build_index", lambda *args: None),
+            (run_pipeline, "update_period_digests", AsyncMock()),
+            (run_pipeline, "generate_lay_summary", AsyncMock(side_effect=_fake_summary)),
+            (run_pipeline, "check_hallucinations", AsyncMock(return_value=(0, []))),
+        ):
+            patcher = patch.object(target, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.summaries_path = data_dir / "pubmed_summaries_2020.json"
+        self.articles = [_article(p) for p in ("1", "2", "3")]
+
+    async def test_resumes_from_existing_summaries(self):
+        earlier = SummaryResult(pmid="1", title="Study 1", summary="Earlier summary")
+        self.summaries_path.write_text(json.dumps([earlier.model_dump()]), encoding="utf-8")
+
+        with patch.object(run_pipeline, "fetch_pubmed_articles", AsyncMock(return_value=self.articles)):
+            summaries = await run_pipeline.run(PipelineConfig())
+
+        self.assertEqual([s.pmid for s in summaries], ["1", "2", "3"])
+        self.assertEqual(summaries[0].summary, "Earlier summary")
+        self.assertEqual(summaries[0].pub_date, "2020 Mar 1")
+        summarized = [call.args[0].pmid for call in run_pipeline.generate_lay_summary.await_args_list]
+        self.assertEqual(sorted(summarized), ["2", "3"])
+
+        stored = json.loads(self.summaries_path.read_text(encoding="utf-8"))
+        self.assertEqual([row["pmid"] for row in stored], ["1", "2", "3"])
+
+    async def test_force_refresh_summarizes_everything(self):
+        earlier = SummaryResult(pmid="1", title="Study 1", summary="Earlier summary")
+        self.summaries_path.write_text(json.dumps([earlier.model_dump()]), encoding="utf-8")
+
+        with patch.object(run_pipeline, "fetch_pubmed_articles", AsyncMock(return_value=self.articles)):
+            summaries = await run_pipeline.run(PipelineConfig(force_refresh=True))
+
+        self.assertEqual(summaries[0].summary, "Summary of 1")
+
+
+class TestWork(IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        data_dir = Path(self.tmp_dir.name)
+
+        self.articles = {p: _article(p) for p in ("1", "2", "3", "4", "5", "6")}
+
+        async def fetch(pmids):
+            return [self.articles[p] for p in pmids]
+
+        for target, name, value in (
+            (run_pipeline, "DATA_DIR", data_dir),
+            (run_pipeline, "fetch_articles_by_pmids", AsyncMock(side_effect=fetch)),
+            (run_pipeline, "generate_lay_summary", AsyncMock(side_effect=_fake_summary)),
+            (run_pipeline, "check_hallucinations", AsyncMock(return_value=(0, []))),
+        ):
+            patcher = patch.object(target, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.queue = WorkQueue(run_pipeline._queue_path(PipelineConfig()), retry_delay=0)
+        self.addCleanup(self.queue.close)
+        self.queue.enqueue(list(self.articles), unit_size=3)
+
+    async def test_failed_articles_are_requeued_and_retried(self):
+        calls: dict[str, int] = {}
+
+        async def fails_once(article):
+            calls[article.pmid] = calls.get(article.pmid, 0) + 1
+            if article.pmid == "2" and calls["2"] == 1:
+                raise RuntimeError("upstream error")
+            return await _fake_summary(article)
+
+        run_pipeline.generate_lay_summary.side_effect = fails_once
+        with patch.object(run_pipeline.WorkQueue, "_backoff", lambda self, attempts: 0), \
+                self.assertLogs("run_pipeline", level="WARNING"):
+            completed = await run_pipeline.work(PipelineConfig())
+
+        self.assertEqual(completed, 3)
+        self.assertEqual(self.queue.counts(), {"done": 3})
+        # each article is merged once: the failed one from the requeued unit
+        for key in ("articles", "summaries"):
+            pmids = [row["pmid"] for result in self.queue.results() for row in result[key]]
+            self.assertEqual(sorted(pmids), list(self.articles))
+        self.assertEqual(calls["2"], 2)
+
+    async def test_deferred_articles_are_requeued_and_resumed(self):
+        estimate = estimate_article(self.articles["1"]).total_tokens
+
+        async def spends_estimate(article):
+            USAGE.record({"input_tokens": estimate_article(article).total_tokens, "output_tokens": 0})
+            return await _fake_summary(article)
+
+        run_pipeline.generate_lay_summary.side_effect = spends_estimate
+        with patch.object(RATE_LIMITER, "max_concurrency", 1):
+            await run_pipeline.work(PipelineConfig(token_budget=int(estimate * 4.5)))
+
+        summarized = [row["pmid"] for result in self.queue.results() for row in result["summaries"]]
+        self.assertEqual(summarized, ["1", "2", "3", "4"])
+        self.assertEqual(self.queue.counts(), {"done": 2, "pending": 1})
+
+        # a rerun with a larger budget resumes the deferred articles
+        with patch.object(RATE_LIMITER, "max_concurrency", 1):
+            await run_pipeline.work(PipelineConfig(token_budget=estimate * 45))
+
+        summarized = [row["pmid"] for result in self.queue.results() for row in result["summaries"]]
+        self.assertEqual(summarized, list(self.articles))
+        self.assertEqual(self.queue.counts(), {"done": 3})
@@ -0,0 +1,107 @@
+import tempfile
+from datetime import date
+from pathlib import Path
+from unittest import TestCase
+from unittest.mock import patch
+
+from api import search_index
+from api.models import ArticleFilter, PipelineConfig, PubMedArticle, SummaryResult
+
+
+class TestSearchIndex(TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        patcher = patch.object(search_index, "DATA_DIR", Path(self.tmp_dir.name))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.config = PipelineConfig()
+        articles = [
+            PubMedArticle(pmid="1", title="Remdesivir in hospitalised patients",
+                          abstract="Antiviral treatment shortened recovery.", journal="NEJM", pub_date="2020 Mar 3"),
+            PubMedArticle(pmid="2", title="Mask wearing and transmission",
+                          abstract="Community masking reduced spread.", journal="Lancet", pub_date="2020 Apr"),
+            PubMedArticle(pmid="3", title="Dexamethasone trial",
+                          abstract="Steroids lowered mortality in ventilated patients.", journal="NEJM",
+                          pub_date="2020 Jul 17"),
+            PubMedArticle(pmid="4", title="Unsummarized study", abstract="Patients were followed up.",
+                          journal="BMJ", pub_date=None),
+        ]
+        summaries = [
+            SummaryResult(pmid=a.pmid, title=a.title, summary=f"Plain summary of {a.title}.",
+                          pub_date=a.pub_date, hallucination_score=1, questionable_claims=["claim"])
+            for a in articles[:3]
+        ]
+        search_index.build_index(self.config, articles, summaries)
+
+    def test_keyword_search_matches_title_abstract_and_summary(self):
+        page = search_index.search(self.config, ArticleFilter(keywords="patients"))
+
+        self.assertEqual(page.total, 3)
+        self.assertEqual({hit.pmid for hit in page.results}, {"1", "3", "4"})
+        self.assertTrue(all("[" in hit.snippet for hit in page.results))
+
+        # every word must match, and FTS syntax in user input is taken literally
+        self.assertEqual([h.pmid for h in search_index.search(self.config, ArticleFilter(keywords="steroids patients")).results], ["3"])
+        self.assertEqual(search_index.search(self.config, ArticleFilter(keywords='mask" OR "')).total, 0)
+
+    def test_filters_and_pagination(self):
+        nejm = ArticleFilter(journal="nejm")
+        self.assertEqual([h.pmid for h in search_index.search(self.config, nejm).results], ["3", "1"])
+
+        spring = ArticleFilter(date_from=date(2020, 3, 15), date_to=date(2020, 7, 31))
+        self.assertEqual([h.pmid for h in search_index.search(self.config, spring).results], ["3", "2"])
+
+        # without keywords: newest first, undated last
+        first = search_index.search(self.config, page=1, page_size=3)
+        second = search_index.search(self.config, page=2, page_size=3)
+        self.assertEqual(first.total, 4)
+        self.assertEqual([h.pmid for h in first.results], ["3", "2", "1"])
+        self.assertEqual([h.pmid for h in second.results], ["4"])
+
+    def test_facets(self):
+        result = search_index.facets(self.config)
+        self.assertEqual([(f.value, f.count) for f in result.journals], [("NEJM", 2), ("BMJ", 1), ("Lancet", 1)])
+        self.assertEqual([f.value for f in result.months], ["2020-03", "2020-04", "2020-07"])
+
+        narrowed = search_index.facets(self.config, ArticleFilter(keywords="patients"))
+        self.assertEqual([(f.value, f.count) for f in narrowed.journals], [("NEJM", 2), ("BMJ", 1)])
+
+    def test_filtered_summaries_and_get_article(self):
+        summaries = search_index.filtered_summaries(self.config, ArticleFilter(keywords="patients"))
+        # article 4 matches but has no summary
+        self.assertEqual([s.pmid for s in summaries], ["1", "3"])
+        self.assertEqual(summaries[0].questionable_claims, ["claim"])
+
+        article = search_index.get_article(self.config, "1")
+        self.assertEqual(article.journal, "NEJM")
+        self.assertEqual(article.summary, "Plain summary of Remdesivir in hospitalised patients.")
+        self.assertIsNone(search_index.get_article(self.config, "999"))
+
+    def test_filtered_summaries_resolve_near_duplicates(self):
+        articles = [
+            PubMedArticle(pmid="1", title="Ivermectin trial", abstract="No effect on viral clearance.",
+                          pub_date="2020 May 1"),
+            PubMedArticle(pmid="2", title="Ivermectin trial (reprint)", abstract="Reprinted in Spanish.",
+                          pub_date="2020 Jun 1"),
+        ]
+        summaries = [
+            SummaryResult(pmid="1", title="Ivermectin trial", summary="Ivermectin did not help."),
+            SummaryResult(pmid="2", title="Ivermectin trial (reprint)", summary="Ivermectin did not help.",
+                          duplicate_of="1"),
+        ]
+        search_index.build_index(self.config, articles, summaries)
+
+        # only the duplicate matches; its canonical summary is used instead, once
+        for keywords in ("spanish", "ivermectin"):
+            matched = search_index.filtered_summaries(self.config, ArticleFilter(keywords=keywords))
+            self.assertEqual([(s.pmid, s.duplicate_of) for s in matched], [("1", None)])
+
+    def test_rebuild_replaces_index(self):
+        search_index.build_index(self.config, [PubMedArticle(pmid="9", title="Only one", abstract="x")], [])
+        self.assertEqual(search_index.search(self.config).total, 1)
+
+    def test_missing_index_raises(self):
+        with self.assertRaises(FileNotFoundError):
+            search_index.search(PipelineConfig(year=1999))
@@ -0,0 +1,79 @@
+import asyncio
+import json
+import tempfile
+from pathlib import Path
+from unittest import IsolatedAsyncioTestCase
+
+from api import tracing
+from api.tracing import Span, critical_path, span, traced
+
+
+def _span(name: str, span_id: str, start: int, end: int, parent: str | None = None) -> Span:
+    return Span(name=name, trace_id="t", span_id=span_id, parent_id=parent,
+                start_ns=start * 1_000_000, end_ns=end * 1_000_000)
+
+
+class TestTracing(IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        tracing.configure()
+        self.addCleanup(setattr, tracing.TRACER, "enabled", False)
+
+    async def test_spans_nest_across_tasks(self):
+        @traced("child")
+        async def child():
+            await asyncio.sleep(0)
+
+        with span("root", items=2):
+            await asyncio.gather(child(), child())
+
+        by_name = {}
+        for s in tracing.TRACER.spans:
+            by_name.setdefault(s.name, []).append(s)
+
+        root = by_name["root"][0]
+        self.assertEqual(root.attributes, {"items": 2})
+        self.assertEqual([c.parent_id for c in by_name["child"]], [root.span_id] * 2)
+
+    async def test_disabled_tracer_records_nothing(self):
+        tracing.TRACER.enabled = False
+
+        with span("ignored") as current:
+            self.assertIsNone(current)
+
+        self.assertEqual(tracing.TRACER.spans, [])
+
+    async def test_error_is_recorded(self):
+        with self.assertRaises(ValueError):
+            with span("boom"):
+                raise ValueError("bad")
+
+        self.assertEqual(tracing.TRACER.spans[0].error, "ValueError: bad")
+
+    async def test_critical_path_follows_sequential_and_slowest_children(self):
+        spans = [
+            _span("run", "r", 0, 100),
+            _span("fetch", "f", 0, 20, "r"),
+            _span("summarize", "s", 20, 95, "r"),
+            _span("fast", "a", 20, 40, "s"),
+            _span("slow", "b", 20, 90, "s"),
+        ]
+
+        path = [(depth, s.name) for depth, s in critical_path(spans)]
+
+        self.assertEqual(path, [(0, "run"), (1, "fetch"), (1, "summarize"), (2, "slow")])
+        self.assertIn("summarize", tracing.report(spans))
+
+    async def test_export_writes_otlp_json(self):
+        with span("root", pmid="1"):
+            pass
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = Path(tmp_dir) / "trace.json"
+            tracing.export(path)
+            payload = json.loads(path.read_text(encoding="utf-8"))
+
+        otlp_span = payload["resourceSpans"][0]["scopeSpans"][0]["spans"][0]
+        self.assertEqual(otlp_span["name"], "root")
+        self.assertEqual(len(otlp_span["traceId"]), 32)
+        self.assertEqual(otlp_span["attributes"], [{"key": "pmid", "value": {"stringValue": "1"}}])
+        self.assertNotIn("parentSpanId", otlp_span)
@@ -0,0 +1,18 @@
+from datetime import date
+from unittest import TestCase
+
+from api.utils import parse_pub_date
+
+
+class TestParsePubDate(TestCase):
+    def test_pubmed_formats(self):
+        self.assertEqual(parse_pub_date("2020 Mar 15"), date(2020, 3, 15))
+        self.assertEqual(parse_pub_date("2020 Mar-Apr"), date(2020, 3, 1))
+        self.assertEqual(parse_pub_date("2020 Spring"), date(2020, 4, 1))
+        self.assertEqual(parse_pub_date("2020"), date(2020, 1, 1))
+        self.assertEqual(parse_pub_date("2020-02-01"), date(2020, 2, 1))
+
+    def test_invalid_dates(self):
+        self.assertIsNone(parse_pub_date(None))
+        self.assertIsNone(parse_pub_date("unknown"))
+        self.assertEqual(parse_pub_date("2020 Feb 30"), date(2020, 2, 1))
@@ -0,0 +1,186 @@
+import tempfile
+import time
+from pathlib import Path
+from unittest import TestCase
+
+from api.work_queue import WorkQueue
+
+
+class TestWorkQueue(TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        self.path = Path(self.tmp_dir.name) / "queue.sqlite"
+        self.queue = WorkQueue(self.path)
+        self.addCleanup(self.queue.close)
+
+    def test_enqueue_splits_into_units(self):
+        units = self.queue.enqueue(["1", "2", "3", "4", "5"], unit_size=2)
+
+        self.assertEqual(units, 3)
+        self.assertEqual(self.queue.counts(), {"pending": 3})
+
+    def test_enqueue_refuses_existing_queue(self):
+        self.queue.enqueue(["1"], unit_size=1)
+
+        with self.assertRaises(RuntimeError):
+            self.queue.enqueue(["2"], unit_size=1)
+
+    def test_claims_are_exclusive_across_connections(self):
+        self.queue.enqueue(["1", "2", "3"], unit_size=2)
+        other = WorkQueue(self.path)
+        self.addCleanup(other.close)
+
+        first = self.queue.claim("a")
+        second = other.claim("b")
+
+        self.assertEqual(first.pmids, ["1", "2"])
+        self.assertEqual(second.pmids, ["3"])
+        self.assertIsNone(other.claim("b"))
+
+    def test_complete_and_results_in_enqueue_order(self):
+        self.queue.enqueue(["1", "2"], unit_size=1)
+        first = self.queue.claim("a")
+        second = self.queue.claim("a")
+
+        self.assertTrue(self.queue.complete(second.id, "a", {"pmids": second.pmids}))
+        self.assertTrue(self.queue.complete(first.id, "a", {"pmids": first.pmids}))
+
+        self.assertEqual(self.queue.results(), [{"pmids": ["1"]}, {"pmids": ["2"]}])
+        self.assertEqual(self.queue.counts(), {"done": 2})
+
+    def test_expired_lease_is_reclaimed(self):
+        queue = WorkQueue(self.path, lease_seconds=-1)
+        self.addCleanup(queue.close)
+        queue.enqueue(["1"], unit_size=1)
+
+        lost = queue.claim("a")
+        reclaimed = queue.claim("b")
+
+        self.assertEqual(reclaimed.id, lost.id)
+        self.assertEqual(reclaimed.attempts, 2)
+        # the original worker can no longer commit
+        self.assertFalse(queue.complete(lost.id, "a", {}))
+        self.assertTrue(queue.complete(reclaimed.id, "b", {}))
+
+    def test_release_marks_failed_after_max_attempts(self):
+        queue = WorkQueue(self.path, max_attempts=2, retry_delay=0)
+        self.addCleanup(queue.close)
+        queue.enqueue(["1"], unit_size=1)
+
+        unit = queue.claim("a")
+        queue.release(unit.id, "a")
+        self.assertEqual(queue.counts(), {"pending": 1})
+
+        unit = queue.claim("a")
+        queue.release(unit.id, "a")
+        self.assertEqual(queue.counts(), {"failed": 1})
+        self.assertIsNone(queue.claim("a"))
+
+    def test_complete_requeues_retry_pmids_with_backoff(self):
+        queue = WorkQueue(self.path, retry_delay=60)
+        self.addCleanup(queue.close)
+        queue.enqueue(["1", "2", "3"], unit_size=3)
+
+        unit = queue.claim("a")
+        self.assertTrue(queue.complete(unit.id, "a", {"pmids": ["1", "3"]}, retry=["2"]))
+
+        self.assertEqual(queue.results(), [{"pmids": ["1", "3"]}])
+        self.assertEqual(queue.counts(), {"done": 1, "pending": 1})
+        self.assertIsNone(queue.claim("b"))
+        self.assertGreater(queue.retry_in(), 25)
+
+    def test_requeued_pmids_carry_the_unit_attempts(self):
+        queue = WorkQueue(self.path, max_attempts=2, retry_delay=0)
+        self.addCleanup(queue.close)
+        queue.enqueue(["1", "2", "3"], unit_size=3)
+
+        unit = queue.claim("a")
+        queue.complete(unit.id, "a", {"pmids": ["1", "3"]}, retry=["2"])
+
+        retry = queue.claim("b")
+        self.assertEqual((retry.pmids, retry.attempts), (["2"], 2))
+        queue.complete(retry.id, "b", {"pmids": []}, retry=["2"])
+        self.assertEqual(queue.counts(), {"done": 2, "failed": 1})
+
+    def test_complete_requeues_deferred_pmids_as_a_fresh_unit(self):
+        self.queue.enqueue(["1", "2", "3"], unit_size=3)
+
+        unit = self.queue.claim("a")
+        self.queue.complete(unit.id, "a", {"pmids": ["1"]}, deferred=["2", "3"])
+
+        deferred = self.queue.claim("b")
+        self.assertEqual((deferred.pmids, deferred.attempts), (["2", "3"], 1))
+
+    def test_released_unit_waits_for_backoff(self):
+        queue = WorkQueue(self.path, retry_delay=60)
+        self.addCleanup(queue.close)
+        queue.enqueue(["1"], unit_size=1)
+
+        unit = queue.claim("a")
+        queue.release(unit.id, "a")
+
+        self.assertIsNone(queue.claim("b"))
+        self.assertGreater(queue.retry_in(), 25)
+        self.assertEqual(queue.counts(), {"pending": 1})
+
+    def test_renew_extends_lease(self):
+        queue = WorkQueue(self.path, lease_seconds=0.2)
+        self.addCleanup(queue.close)
+        queue.enqueue(["1"], unit_size=1)
+
+        unit = queue.claim("a")
+        time.sleep(0.12)
+        self.assertTrue(queue.renew(unit.id, "a"))
+        time.sleep(0.12)
+
+        # without the renewal the lease would have expired by now
+        self.assertIsNone(queue.claim("b"))
+        self.assertFalse(queue.renew(unit.id, "b"))
+
+    def test_reserve_grants_what_is_left_of_the_budget(self):
+        self.queue.enqueue(["1", "2", "3"], unit_size=1)
+        first = self.queue.claim("a", token_budget=1000)
+        second = self.queue.claim("b", token_budget=1000)
+
+        self.assertEqual(self.queue.reserve(first.id, "a", 700, 0.7, token_budget=1000), (700, None))
+        # the other unit only gets what the first one has not reserved
+        self.assertEqual(self.queue.reserve(second.id, "b", 700, 0.7, token_budget=1000), (300, None))
+
+        # actual spend replaces the reservation
+        self.assertTrue(self.queue.complete(first.id, "a", {}, spent_tokens=500, spent_cost=0.5))
+        self.assertEqual(self.queue.spent(), (500, 0.5))
+        tokens, cost = self.queue.reserve(second.id, "b", 700, 0.7, token_budget=1000, cost_budget=0.6)
+        self.assertEqual(tokens, 500)
+        self.assertAlmostEqual(cost, 0.1)
+
+    def test_claim_stops_once_budget_is_spent(self):
+        self.queue.enqueue(["1", "2"], unit_size=1)
+        unit = self.queue.claim("a", cost_budget=1.0)
+        self.queue.complete(unit.id, "a", {}, spent_tokens=100, spent_cost=1.0)
+
+        self.assertTrue(self.queue.budget_reached(cost_budget=1.0))
+        self.assertIsNone(self.queue.claim("a", cost_budget=1.0))
+        self.assertIsNotNone(self.queue.claim("a"))
+
+    def test_claim_stops_once_reservations_use_up_the_budget(self):
+        self.queue.enqueue(["1", "2"], unit_size=1)
+        unit = self.queue.claim("a", token_budget=1000)
+        self.queue.reserve(unit.id, "a", 1000, 0.0, token_budget=1000)
+
+        # nothing is spent yet, but the running unit holds the whole budget
+        self.assertEqual(self.queue.spent(), (0, 0))
+        self.assertIsNone(self.queue.claim("b", token_budget=1000))
+
+        self.queue.complete(unit.id, "a", {}, spent_tokens=400)
+        self.assertIsNotNone(self.queue.claim("b", token_budget=1000))
+
+    def test_lapsed_lease_holds_no_reservation(self):
+        queue = WorkQueue(self.path, lease_seconds=-1)
+        self.addCleanup(queue.close)
+        queue.enqueue(["1"], unit_size=1)
+        unit = queue.claim("a", token_budget=1000)
+        queue.reserve(unit.id, "a", 1000, 0.0, token_budget=1000)
+
+        reclaimed = queue.claim("b", token_budget=1000)
+        self.assertEqual(reclaimed.id, unit.id)